@@ -21,20 +21,31 @@ def recv_all(sock: socket.socket, timeout: float = 3.0) -> bytes:
 
 
 def parse_response(raw: bytes):
-    try:
-        header_raw, body = raw.split(b"\r\n\r\n", 1)
-    except ValueError:
-        return (0, {}, raw)
-    header_text = header_raw.decode("iso-8859-1", errors="replace")
-    lines = header_text.split("\r\n")
-    status_line = lines[0] if lines else ""
-    parts = status_line.split()
+    # Scan for the header/body split and keep the body as a memoryview into
+    # `raw` instead of copying it out; only the (small) header lines are
+    # sliced and decoded.
+    idx = raw.find(b"\r\n\r\n")
+    if idx < 0:
+        return (0, {}, memoryview(raw))
+    body = memoryview(raw)[idx + 4:]
+
+    nl = raw.find(b"\r\n", 0, idx)
+    end = nl if nl >= 0 else idx
+    parts = raw[:end].split()
     status = int(parts[1]) if len(parts) >= 2 and parts[1].isdigit() else 0
+
     headers = {}
-    for line in lines[1:]:
-        if ":" in line:
-            k, v = line.split(":", 1)
-            headers[k.strip().lower()] = v.strip()
+    pos = end + 2
+    while 0 <= pos < idx:
+        nl = raw.find(b"\r\n", pos, idx)
+        if nl < 0:
+            nl = idx
+        line = raw[pos:nl]
+        colon = line.find(b":")
+        if colon > 0:
+            key = line[:colon].strip().lower().decode("ascii", errors="replace")
+            headers[key] = line[colon + 1:].strip().decode("iso-8859-1", errors="replace")
+        pos = nl + 2
     return (status, headers, body)
 
 
@@ -58,11 +69,11 @@ def main():
     status, headers, body = parse_response(raw)
     ctype = headers.get("content-type", "")
     if status != 200:
-        print(body.decode("utf-8", errors="replace"))
+        print(bytes(body).decode("utf-8", errors="replace"))
         sys.exit(1)
 
     if ctype.startswith("text/html"):
-        print(body.decode("utf-8", errors="replace"))
+        print(bytes(body).decode("utf-8", errors="replace"))
     elif ctype.startswith("image/png"):
         outdir.mkdir(parents=True, exist_ok=True)
         filename = Path(path).name or "image.png"
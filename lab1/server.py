@@ -1,81 +1,152 @@
+import asyncio
 import os
 import socket
+import stat
 import sys
+import time
 import mimetypes
+from functools import lru_cache
 from pathlib import Path
 
 
 def build_http_response(status_code: int, reason: str, headers: dict, body: bytes) -> bytes:
-    lines = [f"HTTP/1.1 {status_code} {reason}\r\n"]
+    # Bytes-native builder: one %-format per line and a single join, instead
+    # of building str lines and re-encoding the whole header.
+    out = [b"HTTP/1.1 %d %s\r\n" % (status_code, reason.encode("ascii"))]
     for key, value in headers.items():
-        lines.append(f"{key}: {value}\r\n")
-    lines.append("\r\n")
-    header_bytes = "".join(lines).encode("iso-8859-1")
-    return header_bytes + body
+        out.append(b"%s: %s\r\n" % (key.encode("iso-8859-1"),
+                                     str(value).encode("iso-8859-1")))
+    out.append(b"\r\n")
+    if body:
+        out.append(body)
+    return b"".join(out)
+
+
+_date_cache = [0, ""]
 
 
 def http_date(ts: float | None = None) -> str:
-    # RFC 7231 format
+    # RFC 7231 format; Date has 1-second resolution, so re-format at most
+    # once per second (a racing duplicate format is harmless).
     import email.utils
-    return email.utils.formatdate(ts, usegmt=True)
+    if ts is not None:
+        return email.utils.formatdate(ts, usegmt=True)
+    now = int(time.time())
+    if now != _date_cache[0]:
+        _date_cache[1] = email.utils.formatdate(now, usegmt=True)
+        _date_cache[0] = now
+    return _date_cache[1]
+
+
+_RESPONSE_200_TMPL = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Date: %s\r\n"
+    b"Content-Type: %s\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+
+
+def build_200_header(ctype_header: str, content_length: int) -> bytes:
+    return _RESPONSE_200_TMPL % (
+        http_date().encode("iso-8859-1"),
+        ctype_header.encode("iso-8859-1"),
+        content_length,
+    )
+
+
+@lru_cache(maxsize=8)
+def _resolved_prefix(base: Path) -> str:
+    return str(base.resolve()) + os.sep
 
 
 def is_safe_path(base: Path, target: Path) -> bool:
+    # The root prefix is invariant, so resolve it once; the target only needs
+    # a lexical normpath (".." in raw paths is rejected before we get here),
+    # avoiding per-request readlink/stat syscalls.
     try:
-        base_resolved = base.resolve()
-        target_resolved = target.resolve()
-        return str(target_resolved).startswith(str(base_resolved))
+        prefix = _resolved_prefix(base)
+        norm = os.path.normpath(str(target))
+        return norm == prefix[:-1] or norm.startswith(prefix)
     except Exception:
         return False
 
 
-def generate_directory_listing(root: Path, directory: Path, request_path: str) -> bytes:
-    entries = []
-    # Add parent link if not at root
-    if directory != root:
-        parent_path = os.path.normpath(os.path.join(request_path, ".."))
-        entries.append(f'<li><a href="{parent_path if parent_path.endswith("/") else parent_path + "/"}">..</a></li>')
-    for entry in sorted(directory.iterdir(), key=lambda p: (not p.is_dir(), p.name.lower())):
-        name = entry.name + ("/" if entry.is_dir() else "")
-        href = request_path.rstrip("/") + "/" + entry.name
-        entries.append(f'<li><a href="{href}">{name}</a></li>')
-    body = f"""
+_LISTING_HEAD_TMPL = """
 <!doctype html>
 <html>
   <head>
     <meta charset="utf-8" />
-    <title>Index of {request_path}</title>
-    <style>body{{font-family:system-ui,Segoe UI,Arial,sans-serif;max-width:800px;margin:2rem auto;padding:0 1rem}} li{{margin:0.25rem 0}}</style>
+    <title>Index of %s</title>
+    <style>body{font-family:system-ui,Segoe UI,Arial,sans-serif;max-width:800px;margin:2rem auto;padding:0 1rem} li{margin:0.25rem 0}</style>
   </head>
   <body>
-    <h1>Index of {request_path}</h1>
+    <h1>Index of %s</h1>
     <ul>
-      {''.join(entries)}
+      """.encode("utf-8")
+
+_LISTING_TAIL = b"""
     </ul>
   </body>
 </html>
-""".encode("utf-8")
-    return body
+"""
 
 
-def guess_content_type(path: Path) -> str | None:
-    ctype, _ = mimetypes.guess_type(str(path))
+def generate_directory_listing(root: Path, directory: Path, request_path: str) -> bytes:
+    entries = []
+    # Add parent link if not at root
+    if directory != root:
+        parent_path = os.path.normpath(os.path.join(request_path, ".."))
+        entries.append(f'<li><a href="{parent_path if parent_path.endswith("/") else parent_path + "/"}">..</a></li>')
+    # os.scandir gets the file type from the readdir() result itself, so the
+    # sort and the dir checks below don't stat every entry.
+    with os.scandir(directory) as it:
+        children = [(entry.is_dir(), entry.name) for entry in it]
+    children.sort(key=lambda e: (not e[0], e[1].lower()))
+    prefix = request_path.rstrip("/") + "/"
+    for is_dir, entry_name in children:
+        name = entry_name + ("/" if is_dir else "")
+        entries.append(f'<li><a href="{prefix}{entry_name}">{name}</a></li>')
+    # The surrounding HTML never changes; only the path and the <li> items
+    # get encoded per request.
+    rp = request_path.encode("utf-8")
+    return (_LISTING_HEAD_TMPL % (rp, rp)
+            + "".join(entries).encode("utf-8")
+            + _LISTING_TAIL)
+
+
+@lru_cache(maxsize=128)
+def _guess(suffix: str) -> str | None:
+    ctype, _ = mimetypes.guess_type("name" + suffix)
     return ctype
 
 
-def handle_request(conn: socket.socket, client_addr, root_dir: Path):
+@lru_cache(maxsize=32)
+def _content_type_header(ctype: str) -> str:
+    return f"{ctype}; charset=utf-8" if ctype.startswith("text/") else ctype
+
+
+def guess_content_type(path: Path) -> str | None:
+    return _guess(path.suffix.lower())
+
+
+def _stat_or_none(path: Path):
     try:
-        conn.settimeout(5.0)
-        data = b""
-        while b"\r\n\r\n" not in data and len(data) < 65536:
-            try:
-                chunk = conn.recv(4096)
-            except (socket.timeout, TimeoutError):
-                # Client didn't send a full request in time; close gracefully
-                return
-            if not chunk:
-                break
-            data += chunk
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+async def handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, root_dir: Path):
+    try:
+        try:
+            data = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5.0)
+        except asyncio.IncompleteReadError as e:
+            data = e.partial
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError):
+            # Client didn't send a full request in time; close gracefully
+            return
         if not data:
             return
         try:
@@ -89,7 +160,8 @@ def handle_request(conn: socket.socket, client_addr, root_dir: Path):
         parts = request_line.split()
         if len(parts) < 3:
             response = build_http_response(400, "Bad Request", {"Date": http_date(), "Connection": "close"}, b"Bad Request")
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
         method, raw_path, _ = parts
         if method != "GET":
@@ -99,7 +171,8 @@ def handle_request(conn: socket.socket, client_addr, root_dir: Path):
                 "Allow": "GET",
                 "Content-Type": "text/plain; charset=utf-8",
             }, b"Method Not Allowed")
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
         # Normalize path
@@ -113,36 +186,44 @@ def handle_request(conn: socket.socket, client_addr, root_dir: Path):
                 path = "/"
         if not path.startswith("/"):
             path = "/" + path
+        if ".." in path:
+            response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
+            writer.write(response)
+            await writer.drain()
+            return
         fs_target = (root_dir / path.lstrip("/"))
 
+        # One stat answers the directory/file/missing questions that used to
+        # take separate is_dir/exists/is_file syscalls.
+        st = _stat_or_none(fs_target)
+
         # If directory, try to serve index.html; otherwise generate listing
-        if fs_target.is_dir():
+        if st is not None and stat.S_ISDIR(st.st_mode):
             index_file = fs_target / "index.html"
-            if index_file.exists():
+            index_st = _stat_or_none(index_file)
+            if index_st is not None and stat.S_ISREG(index_st.st_mode):
                 fs_target = index_file
+                st = index_st
             else:
                 if not is_safe_path(root_dir, fs_target):
                     response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
-                    conn.sendall(response)
+                    writer.write(response)
+                    await writer.drain()
                     return
                 body = generate_directory_listing(root_dir, fs_target, path if path.endswith("/") else path + "/")
-                headers = {
-                    "Date": http_date(),
-                    "Content-Type": "text/html; charset=utf-8",
-                    "Content-Length": str(len(body)),
-                    "Connection": "close",
-                }
-                response = build_http_response(200, "OK", headers, body)
-                conn.sendall(response)
+                writer.write(build_200_header("text/html; charset=utf-8", len(body)))
+                writer.write(body)
+                await writer.drain()
                 return
 
         # Resolve and validate
         if not is_safe_path(root_dir, fs_target):
             response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
-        if not fs_target.exists() or not fs_target.is_file():
+        if st is None or not stat.S_ISREG(st.st_mode):
             body = b"404 Not Found"
             headers = {
                 "Date": http_date(),
@@ -151,7 +232,8 @@ def handle_request(conn: socket.socket, client_addr, root_dir: Path):
                 "Connection": "close",
             }
             response = build_http_response(404, "Not Found", headers, body)
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
         ctype = guess_content_type(fs_target)
@@ -165,46 +247,64 @@ def handle_request(conn: socket.socket, client_addr, root_dir: Path):
                 "Connection": "close",
             }
             response = build_http_response(404, "Not Found", headers, body)
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
+        # Send headers, then hand the body to the kernel via sendfile
+        writer.write(build_200_header(_content_type_header(ctype), st.st_size))
+        await writer.drain()
+        loop = asyncio.get_running_loop()
         with open(fs_target, "rb") as f:
-            body = f.read()
-        headers = {
-            "Date": http_date(),
-            "Content-Type": f"{ctype}; charset=utf-8" if ctype.startswith("text/") else ctype,
-            "Content-Length": str(len(body)),
-            "Connection": "close",
-        }
-        response = build_http_response(200, "OK", headers, body)
-        conn.sendall(response)
+            await loop.sendfile(writer.transport, f)
     finally:
         try:
-            conn.close()
+            writer.close()
+            await writer.wait_closed()
         except Exception:
             pass
 
 
-def run_server(root: str, port: int):
+async def serve(root: str, port: int, reuse_port: bool = False):
     root_dir = Path(root)
     root_dir.mkdir(parents=True, exist_ok=True)
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind(("0.0.0.0", port))
-        s.listen(5)
-        print(f"Serving {root_dir} on 0.0.0.0:{port}")
-        while True:
-            conn, addr = s.accept()
-            handle_request(conn, addr, root_dir)
+    root_dir = root_dir.resolve()
+
+    async def handle(reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            # Disable Nagle so the header write isn't delayed behind the
+            # sendfile body, and give the kernel a larger send buffer.
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        await handle_request(reader, writer, root_dir)
+
+    server = await asyncio.start_server(handle, "0.0.0.0", port, backlog=1024,
+                                        limit=65536, reuse_port=reuse_port)
+    print(f"Serving {root_dir} on 0.0.0.0:{port} (pid {os.getpid()})")
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(root: str, port: int, workers: int = 1):
+    # With SO_REUSEPORT each worker process gets its own listening socket and
+    # the kernel load-balances incoming connections across them.
+    reuse_port = workers > 1 and hasattr(socket, "SO_REUSEPORT")
+    if reuse_port and hasattr(os, "fork"):
+        for _ in range(workers - 1):
+            if os.fork() == 0:
+                break
+    asyncio.run(serve(root, port, reuse_port=reuse_port))
 
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python server.py <content_dir> [port]", file=sys.stderr)
+        print("Usage: python server.py <content_dir> [port] [workers]", file=sys.stderr)
         sys.exit(1)
     content_dir = sys.argv[1]
     port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
-    run_server(content_dir, port)
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    run_server(content_dir, port, workers)
 
 
 if __name__ == "__main__":
@@ -214,5 +314,3 @@ if __name__ == "__main__":
     mimetypes.add_type("image/png", ".png")
     mimetypes.add_type("application/pdf", ".pdf")
     main()
-
-
@@ -1,6 +1,12 @@
 import requests
 import threading
 import time
+from requests.adapters import HTTPAdapter
+
+# Shared session with a connection pool sized for the burst below, so the
+# 20 threads reuse TCP connections instead of paying a fresh handshake each.
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
 
 
 def test_race_condition():
@@ -12,7 +18,7 @@ def test_race_condition():
     
     def make_request():
         try:
-            response = requests.get("http://server-race-demo:8080/books/Lab2_CS.pdf", timeout=30)
+            response = session.get("http://server-race-demo:8080/books/Lab2_CS.pdf", timeout=30)
             return response.status_code
         except Exception as e:
             return 0
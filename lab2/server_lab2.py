@@ -1,39 +1,102 @@
+import mmap
 import os
+import selectors
 import socket
+import stat
 import sys
 import mimetypes
 import threading
 import time
+from functools import lru_cache
 from pathlib import Path
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, defaultdict, deque
 import json
 
 
 def build_http_response(status_code: int, reason: str, headers: dict, body: bytes) -> bytes:
-    lines = [f"HTTP/1.1 {status_code} {reason}\r\n"]
+    # Bytes-native builder: one %-format per line and a single join, instead
+    # of building str lines and re-encoding the whole header.
+    out = [b"HTTP/1.1 %d %s\r\n" % (status_code, reason.encode("ascii"))]
     for key, value in headers.items():
-        lines.append(f"{key}: {value}\r\n")
-    lines.append("\r\n")
-    header_bytes = "".join(lines).encode("iso-8859-1")
-    return header_bytes + body
+        out.append(b"%s: %s\r\n" % (key.encode("iso-8859-1"),
+                                     str(value).encode("iso-8859-1")))
+    out.append(b"\r\n")
+    if body:
+        out.append(body)
+    return b"".join(out)
+
+
+_date_cache = [0, ""]
 
 
 def http_date(ts: float | None = None) -> str:
-    # RFC 7231 format
+    # RFC 7231 format; Date has 1-second resolution, so re-format at most
+    # once per second (a racing duplicate format is harmless).
     import email.utils
-    return email.utils.formatdate(ts, usegmt=True)
+    if ts is not None:
+        return email.utils.formatdate(ts, usegmt=True)
+    now = int(time.time())
+    if now != _date_cache[0]:
+        _date_cache[1] = email.utils.formatdate(now, usegmt=True)
+        _date_cache[0] = now
+    return _date_cache[1]
+
+
+_RESPONSE_200_TMPL = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Date: %s\r\n"
+    b"Content-Type: %s\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+
+
+def build_200_header(ctype_header: str, content_length: int) -> bytes:
+    return _RESPONSE_200_TMPL % (
+        http_date().encode("iso-8859-1"),
+        ctype_header.encode("iso-8859-1"),
+        content_length,
+    )
+
+
+@lru_cache(maxsize=8)
+def _resolved_prefix(base: Path) -> str:
+    return str(base.resolve()) + os.sep
 
 
 def is_safe_path(base: Path, target: Path) -> bool:
+    # The root prefix is invariant, so resolve it once; the target only needs
+    # a lexical normpath (".." in raw paths is rejected before we get here),
+    # avoiding per-request readlink/stat syscalls.
     try:
-        base_resolved = base.resolve()
-        target_resolved = target.resolve()
-        return str(target_resolved).startswith(str(base_resolved))
+        prefix = _resolved_prefix(base)
+        norm = os.path.normpath(str(target))
+        return norm == prefix[:-1] or norm.startswith(prefix)
     except Exception:
         return False
 
 
+_LISTING_HEAD_TMPL = """
+<!doctype html>
+<html>
+  <head>
+    <meta charset="utf-8" />
+    <title>Index of %s</title>
+    <style>body{font-family:system-ui,Segoe UI,Arial,sans-serif;max-width:800px;margin:2rem auto;padding:0 1rem} li{margin:0.25rem 0}</style>
+  </head>
+  <body>
+    <h1>Index of %s</h1>
+    <ul>
+      """.encode("utf-8")
+
+_LISTING_TAIL = b"""
+    </ul>
+  </body>
+</html>
+"""
+
+
 def generate_directory_listing(root: Path, directory: Path, request_path: str, counters: dict) -> bytes:
     entries = []
     # Add parent link if not at root
@@ -41,256 +104,465 @@ def generate_directory_listing(root: Path, directory: Path, request_path: str, c
         parent_path = os.path.normpath(os.path.join(request_path, ".."))
         entries.append(f'<li><a href="{parent_path if parent_path.endswith("/") else parent_path + "/"}">..</a></li>')
     
-    for entry in sorted(directory.iterdir(), key=lambda p: (not p.is_dir(), p.name.lower())):
-        name = entry.name + ("/" if entry.is_dir() else "")
-        href = request_path.rstrip("/") + "/" + entry.name
-        
+    # os.scandir gets the file type from the readdir() result itself, so the
+    # sort and the dir/file checks below don't stat every entry.
+    with os.scandir(directory) as it:
+        children = [(entry.is_dir(), entry.name) for entry in it]
+    children.sort(key=lambda e: (not e[0], e[1].lower()))
+    prefix = request_path.rstrip("/") + "/"
+    for is_dir, entry_name in children:
+        name = entry_name + ("/" if is_dir else "")
+        href = prefix + entry_name
+
         # Add counter display for files
         counter_text = ""
-        if entry.is_file():
-            file_path = str(entry.relative_to(root))
+        if not is_dir:
+            file_path = str((directory / entry_name).relative_to(root))
             count = counters.get(file_path, 0)
             counter_text = f" <span style='color: #666; font-size: 0.9em'>({count} requests)</span>"
-        
+
         entries.append(f'<li><a href="{href}">{name}</a>{counter_text}</li>')
     
-    body = f"""
-<!doctype html>
-<html>
-  <head>
-    <meta charset="utf-8" />
-    <title>Index of {request_path}</title>
-    <style>body{{font-family:system-ui,Segoe UI,Arial,sans-serif;max-width:800px;margin:2rem auto;padding:0 1rem}} li{{margin:0.25rem 0}}</style>
-  </head>
-  <body>
-    <h1>Index of {request_path}</h1>
-    <ul>
-      {''.join(entries)}
-    </ul>
-  </body>
-</html>
-""".encode("utf-8")
-    return body
+    # The surrounding HTML never changes; only the path and the <li> items
+    # get encoded per request.
+    rp = request_path.encode("utf-8")
+    return (_LISTING_HEAD_TMPL % (rp, rp)
+            + "".join(entries).encode("utf-8")
+            + _LISTING_TAIL)
 
 
-def guess_content_type(path: Path) -> str | None:
-    ctype, _ = mimetypes.guess_type(str(path))
+@lru_cache(maxsize=128)
+def _guess(suffix: str) -> str | None:
+    ctype, _ = mimetypes.guess_type("name" + suffix)
     return ctype
 
 
+@lru_cache(maxsize=32)
+def _content_type_header(ctype: str) -> str:
+    return f"{ctype}; charset=utf-8" if ctype.startswith("text/") else ctype
+
+
+def guess_content_type(path: Path) -> str | None:
+    return _guess(path.suffix.lower())
+
+
 class RateLimiter:
     def __init__(self, max_requests: int = 5, window_seconds: int = 1):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.clients = defaultdict(list)  # IP -> list of timestamps
+        # IP -> deque of timestamps; bounded so a client can never hold more
+        # than max_requests entries, and expiry pops from the left instead of
+        # rebuilding a list per call.
+        self.clients = defaultdict(lambda: deque(maxlen=max_requests))
         self.lock = threading.Lock()
-    
+        self._next_gc = time.time() + 60.0
+
     def is_allowed(self, client_ip: str) -> bool:
         with self.lock:
             now = time.time()
-            # Clean old requests outside the window
-            self.clients[client_ip] = [
-                timestamp for timestamp in self.clients[client_ip]
-                if now - timestamp < self.window_seconds
-            ]
-            
-            # Check if under limit
-            if len(self.clients[client_ip]) < self.max_requests:
-                self.clients[client_ip].append(now)
+            stamps = self.clients[client_ip]
+            while stamps and now - stamps[0] >= self.window_seconds:
+                stamps.popleft()
+
+            if now >= self._next_gc:
+                self._gc(now)
+
+            if len(stamps) < self.max_requests:
+                stamps.append(now)
                 return True
             return False
 
+    def _gc(self, now: float):
+        # Drop idle IPs so the table doesn't grow without bound.
+        cutoff = now - self.window_seconds
+        for ip in [ip for ip, stamps in self.clients.items()
+                   if not stamps or stamps[-1] < cutoff]:
+            del self.clients[ip]
+        self._next_gc = now + 60.0
 
-def handle_request(conn: socket.socket, client_addr, root_dir: Path, counters: dict, counters_lock: threading.Lock, rate_limiter: RateLimiter, simulate_work: bool = False):
-    client_ip = client_addr[0]
-    
+
+class Conn:
+    """Per-connection state for the reactor: read buffer, pending output
+    (header plus optional body buffer) and an optional file descriptor being
+    streamed."""
+
+    __slots__ = ("sock", "addr", "buf", "buf_len", "header_end", "out", "out_off",
+                 "body", "body_off", "file_fd", "file_off",
+                 "file_size", "ready_at", "deadline")
+
+    def __init__(self, sock: socket.socket, addr):
+        self.sock = sock
+        self.addr = addr
+        # Fixed request buffer: recv_into fills it in place, so reading a
+        # request allocates nothing. Requests that don't fit are rejected.
+        self.buf = bytearray(65536)
+        self.buf_len = 0
+        self.header_end = -1
+        self.out = b""
+        self.out_off = 0
+        self.body = None
+        self.body_off = 0
+        self.file_fd = -1
+        self.file_off = 0
+        self.file_size = 0
+        self.ready_at = 0.0
+        self.deadline = time.time() + 5.0
+
+
+@lru_cache(maxsize=64)
+def _open_mmap(path_str: str, mtime_ns: int, size: int) -> mmap.mmap:
+    """Shared read-only mapping of a file, keyed by (path, mtime, size) so a
+    changed file gets a fresh entry. Concurrent requests for the same file
+    share kernel page-cache pages instead of each allocating a full copy."""
+    with open(path_str, "rb") as f:
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+
+_RESPONSE_200_DATE_PREFIX = b"HTTP/1.1 200 OK\r\nDate: "
+
+# Files up to this size are served from the prepared-response cache below;
+# larger ones stream through sendfile without being mapped.
+_HOT_FILE_MAX = 8 << 20
+
+
+@lru_cache(maxsize=256)
+def _prepared(path_str: str, mtime_ns: int, size: int, ctype_header: str):
+    """Everything derivable from the file itself, computed once per (path,
+    mtime): the response header bytes minus the Date value, plus the shared
+    mmap of the body. Serving a cached file is then just parse -> lookup ->
+    one vectored send."""
+    tail = (b"\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n"
+            % (ctype_header.encode("iso-8859-1"), size))
+    return tail, _open_mmap(path_str, mtime_ns, size)
+
+
+def _stat_or_none(path: Path):
     try:
-        conn.settimeout(5.0)
-        data = b""
-        while b"\r\n\r\n" not in data and len(data) < 65536:
-            try:
-                chunk = conn.recv(4096)
-            except (socket.timeout, TimeoutError):
-                return
-            if not chunk:
-                break
-            data += chunk
-        if not data:
-            return
-        
-        # Check rate limiting
-        if not rate_limiter.is_allowed(client_ip):
-            response = build_http_response(429, "Too Many Requests", {
-                "Date": http_date(),
-                "Connection": "close",
-                "Content-Type": "text/plain; charset=utf-8",
-            }, b"Rate limit exceeded. Try again later.")
-            conn.sendall(response)
-            return
-        
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def process_request(buf: memoryview, header_end: int, client_ip: str, root_dir: Path,
+                    counters: Counter, rate_limiter: RateLimiter):
+    """Turn a received request into a response.
+
+    Returns (out, body, fd, size): `out` holds header (and small inline
+    body) bytes, `body` an optional separate body buffer sent with vectored
+    I/O, `fd` an open file descriptor to stream with sendfile (or -1) and
+    `size` its length. Returns (None, None, -1, 0) when the connection
+    should just be closed.
+    """
+    # Check rate limiting
+    if not rate_limiter.is_allowed(client_ip):
+        response = build_http_response(429, "Too Many Requests", {
+            "Date": http_date(),
+            "Connection": "close",
+            "Content-Type": "text/plain; charset=utf-8",
+        }, b"Rate limit exceeded. Try again later.")
+        return response, None, -1, 0
+
+    try:
+        header = bytes(buf[:header_end] if header_end >= 0 else buf).decode("iso-8859-1", errors="replace")
+    except Exception:
+        header = ""
+    lines = header.split("\r\n")
+    if not lines:
+        return None, None, -1, 0
+    request_line = lines[0]
+    parts = request_line.split()
+    if len(parts) < 3:
+        response = build_http_response(400, "Bad Request", {"Date": http_date(), "Connection": "close"}, b"Bad Request")
+        return response, None, -1, 0
+    method, raw_path, _ = parts
+    if method != "GET":
+        response = build_http_response(405, "Method Not Allowed", {
+            "Date": http_date(),
+            "Connection": "close",
+            "Allow": "GET",
+            "Content-Type": "text/plain; charset=utf-8",
+        }, b"Method Not Allowed")
+        return response, None, -1, 0
+
+    # Normalize path
+    path = raw_path.split("?", 1)[0]
+    if path.startswith("http://") or path.startswith("https://"):
         try:
-            header = data.split(b"\r\n\r\n", 1)[0].decode("iso-8859-1", errors="replace")
+            from urllib.parse import urlparse
+            path = urlparse(path).path
         except Exception:
-            header = ""
-        lines = header.split("\r\n")
-        if not lines:
-            return
-        request_line = lines[0]
-        parts = request_line.split()
-        if len(parts) < 3:
-            response = build_http_response(400, "Bad Request", {"Date": http_date(), "Connection": "close"}, b"Bad Request")
-            conn.sendall(response)
-            return
-        method, raw_path, _ = parts
-        if method != "GET":
-            response = build_http_response(405, "Method Not Allowed", {
-                "Date": http_date(),
-                "Connection": "close",
-                "Allow": "GET",
-                "Content-Type": "text/plain; charset=utf-8",
-            }, b"Method Not Allowed")
-            conn.sendall(response)
-            return
+            path = "/"
+    if not path.startswith("/"):
+        path = "/" + path
+    if ".." in path:
+        response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
+        return response, None, -1, 0
+    fs_target = (root_dir / path.lstrip("/"))
 
-        # Normalize path
-        path = raw_path.split("?", 1)[0]
-        if path.startswith("http://") or path.startswith("https://"):
-            try:
-                from urllib.parse import urlparse
-                path = urlparse(path).path
-            except Exception:
-                path = "/"
-        if not path.startswith("/"):
-            path = "/" + path
-        fs_target = (root_dir / path.lstrip("/"))
-
-        # Simulate work if requested
-        if simulate_work:
-            time.sleep(1.0)
-
-        # If directory, try to serve index.html; otherwise generate listing
-        if fs_target.is_dir():
-            index_file = fs_target / "index.html"
-            if index_file.exists():
-                fs_target = index_file
-            else:
-                if not is_safe_path(root_dir, fs_target):
-                    response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
-                    conn.sendall(response)
-                    return
-                
-                # Update counter for directory listing
-                dir_path = str(fs_target.relative_to(root_dir))
-                with counters_lock:
-                    counters[dir_path] = counters.get(dir_path, 0) + 1
-                
-                body = generate_directory_listing(root_dir, fs_target, path if path.endswith("/") else path + "/", counters)
-                headers = {
-                    "Date": http_date(),
-                    "Content-Type": "text/html; charset=utf-8",
-                    "Content-Length": str(len(body)),
-                    "Connection": "close",
-                }
-                response = build_http_response(200, "OK", headers, body)
-                conn.sendall(response)
-                return
+    # One stat answers the directory/file/missing questions that used to
+    # take separate is_dir/exists/is_file syscalls.
+    st = _stat_or_none(fs_target)
 
-        # Resolve and validate
-        if not is_safe_path(root_dir, fs_target):
-            response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
-            conn.sendall(response)
-            return
+    # If directory, try to serve index.html; otherwise generate listing
+    if st is not None and stat.S_ISDIR(st.st_mode):
+        index_file = fs_target / "index.html"
+        index_st = _stat_or_none(index_file)
+        if index_st is not None and stat.S_ISREG(index_st.st_mode):
+            fs_target = index_file
+            st = index_st
+        else:
+            if not is_safe_path(root_dir, fs_target):
+                response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
+                return response, None, -1, 0
 
-        if not fs_target.exists() or not fs_target.is_file():
-            body = b"404 Not Found"
-            headers = {
-                "Date": http_date(),
-                "Content-Type": "text/plain; charset=utf-8",
-                "Content-Length": str(len(body)),
-                "Connection": "close",
-            }
-            response = build_http_response(404, "Not Found", headers, body)
-            conn.sendall(response)
-            return
+            # Update counter for directory listing
+            dir_path = str(fs_target.relative_to(root_dir))
+            counters[dir_path] += 1
 
-        ctype = guess_content_type(fs_target)
-        if ctype is None or not any(ctype.startswith(p) for p in ["text/html", "image/png", "application/pdf"]):
-            body = b"404 Not Found"
-            headers = {
-                "Date": http_date(),
-                "Content-Type": "text/plain; charset=utf-8",
-                "Content-Length": str(len(body)),
-                "Connection": "close",
-            }
-            response = build_http_response(404, "Not Found", headers, body)
-            conn.sendall(response)
-            return
+            body = generate_directory_listing(root_dir, fs_target, path if path.endswith("/") else path + "/", counters)
+            return build_200_header("text/html; charset=utf-8", len(body)), body, -1, 0
 
-        # Update counter for file access
-        file_path = str(fs_target.relative_to(root_dir))
-        with counters_lock:
-            counters[file_path] = counters.get(file_path, 0) + 1
+    # Resolve and validate
+    if not is_safe_path(root_dir, fs_target):
+        response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
+        return response, None, -1, 0
 
-        with open(fs_target, "rb") as f:
-            body = f.read()
+    if st is None or not stat.S_ISREG(st.st_mode):
+        body = b"404 Not Found"
         headers = {
             "Date": http_date(),
-            "Content-Type": f"{ctype}; charset=utf-8" if ctype.startswith("text/") else ctype,
+            "Content-Type": "text/plain; charset=utf-8",
             "Content-Length": str(len(body)),
             "Connection": "close",
         }
-        response = build_http_response(200, "OK", headers, body)
-        conn.sendall(response)
-    finally:
+        return build_http_response(404, "Not Found", headers, body), None, -1, 0
+
+    ctype = guess_content_type(fs_target)
+    if ctype is None or not any(ctype.startswith(p) for p in ["text/html", "image/png", "application/pdf"]):
+        body = b"404 Not Found"
+        headers = {
+            "Date": http_date(),
+            "Content-Type": "text/plain; charset=utf-8",
+            "Content-Length": str(len(body)),
+            "Connection": "close",
+        }
+        return build_http_response(404, "Not Found", headers, body), None, -1, 0
+
+    # Update counter for file access
+    file_path = str(fs_target.relative_to(root_dir))
+    counters[file_path] += 1
+
+    ctype_header = _content_type_header(ctype)
+    if st.st_size == 0:
+        return build_200_header(ctype_header, 0), None, -1, 0
+
+    # Hot path: repeated requests for the same file reuse the prepared
+    # header bytes and shared mmap; only the Date value changes per second.
+    if st.st_size <= _HOT_FILE_MAX or not hasattr(os, "sendfile"):
+        tail, mm = _prepared(str(fs_target), st.st_mtime_ns, st.st_size, ctype_header)
+        out = b"".join((_RESPONSE_200_DATE_PREFIX,
+                        http_date().encode("iso-8859-1"), tail))
+        return out, memoryview(mm), -1, 0
+
+    # Large files: headers go into the outbox and the body is streamed from
+    # the fd by the reactor's sendfile loop.
+    fd = os.open(fs_target, os.O_RDONLY)
+    return build_200_header(ctype_header, st.st_size), None, fd, st.st_size
+
+
+def _close_conn(sel: selectors.DefaultSelector, conn: Conn):
+    try:
+        sel.unregister(conn.sock)
+    except (KeyError, ValueError):
+        pass
+    if conn.file_fd >= 0:
         try:
-            conn.close()
-        except Exception:
+            os.close(conn.file_fd)
+        except OSError:
             pass
+        conn.file_fd = -1
+    try:
+        conn.sock.close()
+    except Exception:
+        pass
+
+
+def _on_writable(sel: selectors.DefaultSelector, conn: Conn):
+    """Flush pending header/body bytes, then stream the file fd. Returns when
+    the socket would block; closes the connection once everything is sent."""
+    try:
+        out = memoryview(conn.out)
+        # Header + body go out in one writev() instead of being concatenated
+        # into a fresh bytes object first.
+        while conn.body is not None and conn.out_off < len(conn.out):
+            n = conn.sock.sendmsg([out[conn.out_off:],
+                                   memoryview(conn.body)[conn.body_off:]])
+            take = min(n, len(conn.out) - conn.out_off)
+            conn.out_off += take
+            conn.body_off += n - take
+        while conn.out_off < len(conn.out):
+            conn.out_off += conn.sock.send(out[conn.out_off:])
+        while conn.body is not None and conn.body_off < len(conn.body):
+            conn.body_off += conn.sock.send(memoryview(conn.body)[conn.body_off:])
+        while conn.file_fd >= 0 and conn.file_off < conn.file_size:
+            sent = os.sendfile(conn.sock.fileno(), conn.file_fd,
+                               conn.file_off, conn.file_size - conn.file_off)
+            if sent == 0:
+                break
+            conn.file_off += sent
+        if conn.file_fd >= 0 and hasattr(socket, "TCP_CORK"):
+            conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+    except BlockingIOError:
+        return
+    except OSError:
+        pass
+    _close_conn(sel, conn)
+
+
+def _start_response(sel: selectors.DefaultSelector, conn: Conn, root_dir: Path,
+                    counters: Counter, rate_limiter: RateLimiter):
+    buf = memoryview(conn.buf)[:conn.buf_len]
+    out, body, fd, size = process_request(buf, conn.header_end, conn.addr[0],
+                                          root_dir, counters, rate_limiter)
+    if out is None:
+        _close_conn(sel, conn)
+        return
+    conn.out = out
+    conn.body = body
+    conn.file_fd = fd
+    conn.file_size = size
+    if conn.file_fd >= 0 and hasattr(socket, "TCP_CORK"):
+        # Cork so the header and the first file pages coalesce (Linux only).
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+    sel.register(conn.sock, selectors.EVENT_WRITE, conn)
+    _on_writable(sel, conn)
+
+
+def _on_readable(sel: selectors.DefaultSelector, conn: Conn, root_dir: Path,
+                 counters: Counter, rate_limiter: RateLimiter,
+                 simulate_work: bool, waiting: list):
+    try:
+        n = conn.sock.recv_into(memoryview(conn.buf)[conn.buf_len:])
+    except BlockingIOError:
+        return
+    except OSError:
+        _close_conn(sel, conn)
+        return
+    if n:
+        scan_from = max(0, conn.buf_len - 3)
+        conn.buf_len += n
+        conn.header_end = conn.buf.find(b"\r\n\r\n", scan_from, conn.buf_len)
+        if conn.header_end < 0:
+            if conn.buf_len < len(conn.buf):
+                return
+            # Buffer full without a complete header: reject rather than grow.
+            sel.unregister(conn.sock)
+            conn.out = build_http_response(413, "Content Too Large", {
+                "Date": http_date(),
+                "Connection": "close",
+                "Content-Type": "text/plain; charset=utf-8",
+            }, b"Request header too large")
+            sel.register(conn.sock, selectors.EVENT_WRITE, conn)
+            _on_writable(sel, conn)
+            return
+    elif not conn.buf_len:
+        _close_conn(sel, conn)
+        return
+    # Full request (or EOF/oversize): stop reading and respond, optionally
+    # after the simulated work delay.
+    sel.unregister(conn.sock)
+    if simulate_work:
+        conn.ready_at = time.time() + 1.0
+        waiting.append(conn)
+    else:
+        _start_response(sel, conn, root_dir, counters, rate_limiter)
 
 
-def run_server(root: str, port: int, max_threads: int = 10, simulate_work: bool = False):
+def run_server(root: str, port: int, simulate_work: bool = False, workers: int = 1):
+    # With SO_REUSEPORT each worker process gets its own listening socket and
+    # accept loop; the kernel load-balances incoming connections across them.
+    # Counters and rate limits become per-worker in that mode.
+    reuse_port = workers > 1 and hasattr(socket, "SO_REUSEPORT")
+    if reuse_port and hasattr(os, "fork"):
+        for _ in range(workers - 1):
+            if os.fork() == 0:
+                break
+
     root_dir = Path(root)
     root_dir.mkdir(parents=True, exist_ok=True)
-    
+    root_dir = root_dir.resolve()
+
     # Shared data structures
-    counters = {}
-    counters_lock = threading.Lock()
+    counters = Counter()
     rate_limiter = RateLimiter(max_requests=5, window_seconds=1)
-    
+
+    sel = selectors.DefaultSelector()
+    waiting: list[Conn] = []  # connections parked for the simulate-work delay
+
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         s.bind(("0.0.0.0", port))
-        s.listen(5)
-        print(f"Serving {root_dir} on 0.0.0.0:{port} (multithreaded, max {max_threads} threads)")
+        s.listen(4096)
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ, None)
+        print(f"Serving {root_dir} on 0.0.0.0:{port} (selectors reactor, pid {os.getpid()})")
         if simulate_work:
             print("Simulating 1s work per request")
-        
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            while True:
-                conn, addr = s.accept()
-                executor.submit(
-                    handle_request, 
-                    conn, 
-                    addr, 
-                    root_dir, 
-                    counters, 
-                    counters_lock, 
-                    rate_limiter,
-                    simulate_work
-                )
+
+        while True:
+            now = time.time()
+            timeout = 1.0
+            if waiting:
+                timeout = max(0.0, min(c.ready_at for c in waiting) - now)
+            events = sel.select(timeout)
+            for key, mask in events:
+                if key.data is None:
+                    # Listening socket: drain the accept queue
+                    while True:
+                        try:
+                            client, addr = s.accept()
+                        except (BlockingIOError, OSError):
+                            break
+                        client.setblocking(False)
+                        # Disable Nagle so small header writes go out at once
+                        # (TCP_CORK still batches around sendfile), and give
+                        # the kernel a larger send buffer for big files.
+                        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                        client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+                        sel.register(client, selectors.EVENT_READ, Conn(client, addr))
+                    continue
+                conn = key.data
+                if mask & selectors.EVENT_READ:
+                    _on_readable(sel, conn, root_dir, counters,
+                                 rate_limiter, simulate_work, waiting)
+                elif mask & selectors.EVENT_WRITE:
+                    _on_writable(sel, conn)
+
+            now = time.time()
+            # Resume connections whose simulated work delay has elapsed
+            for conn in [c for c in waiting if c.ready_at <= now]:
+                waiting.remove(conn)
+                _start_response(sel, conn, root_dir, counters, rate_limiter)
+            # Drop clients that never finished sending a request
+            for key in list(sel.get_map().values()):
+                conn = key.data
+                if conn is not None and conn.header_end < 0 and not conn.out and conn.deadline <= now:
+                    _close_conn(sel, conn)
 
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python server_lab2.py <content_dir> [port] [max_threads] [--simulate-work]", file=sys.stderr)
+        print("Usage: python server_lab2.py <content_dir> [port] [workers] [--simulate-work]", file=sys.stderr)
         sys.exit(1)
-    
+
     content_dir = sys.argv[1]
     port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
-    max_threads = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != "--simulate-work" else 10
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != "--simulate-work" else 1
     simulate_work = "--simulate-work" in sys.argv
-    
-    run_server(content_dir, port, max_threads, simulate_work)
+
+    run_server(content_dir, port, simulate_work, workers)
 
 
 if __name__ == "__main__":
@@ -1,109 +1,234 @@
+import asyncio
+import html
+import itertools
+import logging
 import os
 import socket
+import stat
+import string
 import sys
 import mimetypes
-import threading
 import time
+from functools import lru_cache
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter, defaultdict
 from concurrent.futures import ThreadPoolExecutor
 
+try:
+    import httptools
+except ImportError:  # pure-Python fallback below
+    httptools = None
+
+# The deliberate sleeps/log spam that make the race visible cost ~1.5s per
+# request; only pay for them when explicitly demonstrating the race.
+RACE_DEMO = bool(os.environ.get("RACE_DEMO"))
+
+# COUNTER_MODE=itercount switches the safe counter path to per-key
+# itertools.count iterators - the other lock-free alternative to a mutex.
+COUNTER_MODE = os.environ.get("COUNTER_MODE", "counter")
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
 
 def build_http_response(status_code: int, reason: str, headers: dict, body: bytes) -> bytes:
-    lines = [f"HTTP/1.1 {status_code} {reason}\r\n"]
+    # Bytes-native builder: one %-format per line and a single join, instead
+    # of building str lines and re-encoding the whole header.
+    out = [b"HTTP/1.1 %d %s\r\n" % (status_code, reason.encode("ascii"))]
     for key, value in headers.items():
-        lines.append(f"{key}: {value}\r\n")
-    lines.append("\r\n")
-    header_bytes = "".join(lines).encode("iso-8859-1")
-    return header_bytes + body
+        out.append(b"%s: %s\r\n" % (key.encode("iso-8859-1"),
+                                     str(value).encode("iso-8859-1")))
+    out.append(b"\r\n")
+    if body:
+        out.append(body)
+    return b"".join(out)
+
+
+_date_cache = [0, ""]
 
 
 def http_date(ts: float | None = None) -> str:
+    # RFC 7231 format; Date has 1-second resolution, so re-format at most
+    # once per second. All calls happen on the event-loop thread, so no
+    # lock is needed around the cache.
     import email.utils
-    return email.utils.formatdate(ts, usegmt=True)
+    if ts is not None:
+        return email.utils.formatdate(ts, usegmt=True)
+    now = int(time.time())
+    if now != _date_cache[0]:
+        _date_cache[1] = email.utils.formatdate(now, usegmt=True)
+        _date_cache[0] = now
+    return _date_cache[1]
 
 
-def is_safe_path(base: Path, target: Path) -> bool:
+def is_safe_path(base_resolved: str, target: Path) -> bool:
+    # The root is resolved once at startup; only the target pays a realpath
+    # here, and the os.sep-suffixed prefix avoids /root vs /root2 confusion.
     try:
-        base_resolved = base.resolve()
-        target_resolved = target.resolve()
-        return str(target_resolved).startswith(str(base_resolved))
+        resolved = os.path.realpath(str(target))
+        return resolved == base_resolved or resolved.startswith(base_resolved + os.sep)
     except Exception:
         return False
 
 
-def generate_directory_listing(root: Path, directory: Path, request_path: str, counters: dict) -> bytes:
-    entries = []
-    if directory != root:
-        parent_path = os.path.normpath(os.path.join(request_path, ".."))
-        entries.append(f'<li><a href="{parent_path if parent_path.endswith("/") else parent_path + "/"}">..</a></li>')
-    
-    for entry in sorted(directory.iterdir(), key=lambda p: (not p.is_dir(), p.name.lower())):
-        name = entry.name + ("/" if entry.is_dir() else "")
-        href = request_path.rstrip("/") + "/" + entry.name
-        
-        counter_text = ""
-        if entry.is_file():
-            file_path = str(entry.relative_to(root))
-            count = counters.get(file_path, 0)
-            counter_text = f" <span style='color: #666; font-size: 0.9em'>({count} requests)</span>"
-        
-        entries.append(f'<li><a href="{href}">{name}</a>{counter_text}</li>')
-    
-    body = f"""
+# Compiled once at import: per request only the variable substitution runs,
+# not a re-parse of the static HTML.
+_LISTING_TMPL = string.Template("""
 <!doctype html>
 <html>
   <head>
     <meta charset="utf-8" />
-    <title>Index of {request_path}</title>
-    <style>body{{font-family:system-ui,Segoe UI,Arial,sans-serif;max-width:800px;margin:2rem auto;padding:0 1rem}} li{{margin:0.25rem 0}}</style>
+    <title>Index of $request_path</title>
+    <style>body{font-family:system-ui,Segoe UI,Arial,sans-serif;max-width:800px;margin:2rem auto;padding:0 1rem} li{margin:0.25rem 0}</style>
   </head>
   <body>
-    <h1>Index of {request_path}</h1>
+    <h1>Index of $request_path</h1>
     <ul>
-      {''.join(entries)}
+      $body
     </ul>
   </body>
 </html>
-""".encode("utf-8")
-    return body
+""")
 
 
-def guess_content_type(path: Path) -> str | None:
-    ctype, _ = mimetypes.guess_type(str(path))
+def generate_directory_listing(root: Path, directory: Path, request_path: str, counters: dict) -> bytes:
+    entries = []
+    if directory != root:
+        parent_path = os.path.normpath(os.path.join(request_path, ".."))
+        entries.append(f'<li><a href="{parent_path if parent_path.endswith("/") else parent_path + "/"}">..</a></li>')
+
+    # os.scandir gets the file type from the readdir() result itself, so the
+    # sort and the dir/file checks below don't stat every entry.
+    with os.scandir(directory) as it:
+        children = [(entry.is_dir(), entry.name) for entry in it]
+    children.sort(key=lambda e: (not e[0], e[1].lower()))
+    prefix = request_path.rstrip("/") + "/"
+    for is_dir, entry_name in children:
+        name = entry_name + ("/" if is_dir else "")
+        href = prefix + entry_name
+
+        counter_text = ""
+        if not is_dir:
+            file_path = str((directory / entry_name).relative_to(root))
+            count = counters.get(file_path, 0)
+            counter_text = f" <span style='color: #666; font-size: 0.9em'>({count} requests)</span>"
+
+        entries.append(f'<li><a href="{href}">{name}</a>{counter_text}</li>')
+
+    # html.escape also fixes the injection hole where the raw request path
+    # used to be inlined into the page.
+    return _LISTING_TMPL.substitute(
+        request_path=html.escape(request_path),
+        body="".join(entries),
+    ).encode("utf-8")
+
+
+@lru_cache(maxsize=128)
+def _guess(suffix: str) -> str | None:
+    ctype, _ = mimetypes.guess_type("name" + suffix)
     return ctype
 
 
-def handle_request_naive(conn: socket.socket, client_addr, root_dir: Path, counters: dict, simulate_work: bool = False):
-    """Handle request with naive counter (race condition)"""
+def guess_content_type(path: Path) -> str | None:
+    return _guess(path.suffix.lower())
+
+
+_counter_iters: dict = {}
+
+
+def _bump(counters, path: str) -> None:
+    """Lock-free counter increment.
+
+    Default mode is Counter's C-level `+= 1`. "itercount" mode draws from a
+    per-key itertools.count instead: next() on the iterator is a single C
+    call with no Python-level read-modify-write, demonstrating the atomic
+    counter pattern without a mutex. The drawn value is mirrored into
+    `counters` so listings can display it.
+    """
+    if COUNTER_MODE == "itercount":
+        counters[path] = next(_counter_iters.setdefault(path, itertools.count(1)))
+    else:
+        counters[path] += 1
+
+
+def _stat_or_none(path: Path):
     try:
-        conn.settimeout(5.0)
-        data = b""
-        while b"\r\n\r\n" not in data and len(data) < 65536:
-            try:
-                chunk = conn.recv(4096)
-            except (socket.timeout, TimeoutError):
-                return
-            if not chunk:
-                break
-            data += chunk
-        if not data:
-            return
-        
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+class _UrlCollector:
+    """Callback object for httptools; we only need the request target."""
+
+    __slots__ = ("url",)
+
+    def __init__(self):
+        self.url = None
+
+    def on_url(self, url: bytes):
+        self.url = url
+
+
+def parse_request_line(data: bytes):
+    """Extract (method, raw_path) from a request buffer.
+
+    Uses httptools' C parser when available (one pass over the bytes, no
+    intermediate str splitting); otherwise falls back to the hand-rolled
+    split-based parse. Returns None for malformed requests.
+    """
+    if httptools is not None:
+        collector = _UrlCollector()
+        parser = httptools.HttpRequestParser(collector)
         try:
-            header = data.split(b"\r\n\r\n", 1)[0].decode("iso-8859-1", errors="replace")
-        except Exception:
-            header = ""
-        lines = header.split("\r\n")
-        if not lines:
+            parser.feed_data(data)
+        except httptools.HttpParserError:
+            return None
+        if collector.url is None:
+            return None
+        return parser.get_method().decode("ascii"), collector.url.decode("iso-8859-1")
+
+    try:
+        header = data.split(b"\r\n\r\n", 1)[0].decode("iso-8859-1", errors="replace")
+    except Exception:
+        return None
+    lines = header.split("\r\n")
+    if not lines:
+        return None
+    parts = lines[0].split()
+    if len(parts) < 3:
+        return None
+    return parts[0], parts[1]
+
+
+async def handle_request_naive(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               root_dir: Path, root_resolved: str, counters: dict,
+                               disk: ThreadPoolExecutor, simulate_work: bool = False):
+    """Handle request with naive counter (race condition).
+
+    One event-loop thread multiplexes all connections; only blocking disk
+    calls (open/stat) hop to the small `disk` executor. The RACE_DEMO
+    read-modify-write still races because the awaits between its steps let
+    other request tasks interleave.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        try:
+            data = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5.0)
+        except asyncio.IncompleteReadError as e:
+            data = e.partial
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError):
+            return
+        if not data:
             return
-        request_line = lines[0]
-        parts = request_line.split()
-        if len(parts) < 3:
+
+        parsed = parse_request_line(data)
+        if parsed is None:
             response = build_http_response(400, "Bad Request", {"Date": http_date(), "Connection": "close"}, b"Bad Request")
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
-        method, raw_path, _ = parts
+        method, raw_path = parsed
         if method != "GET":
             response = build_http_response(405, "Method Not Allowed", {
                 "Date": http_date(),
@@ -111,7 +236,8 @@ def handle_request_naive(conn: socket.socket, client_addr, root_dir: Path, count
                 "Allow": "GET",
                 "Content-Type": "text/plain; charset=utf-8",
             }, b"Method Not Allowed")
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
         path = raw_path.split("?", 1)[0]
@@ -126,32 +252,39 @@ def handle_request_naive(conn: socket.socket, client_addr, root_dir: Path, count
         fs_target = (root_dir / path.lstrip("/"))
 
         if simulate_work:
-            time.sleep(1.0)
+            await asyncio.sleep(1.0)
+
+        # One stat answers the directory/file/missing questions that used to
+        # take separate is_dir/exists/is_file syscalls.
+        st = await loop.run_in_executor(disk, _stat_or_none, fs_target)
 
-        if fs_target.is_dir():
+        if st is not None and stat.S_ISDIR(st.st_mode):
             index_file = fs_target / "index.html"
-            if index_file.exists():
+            index_st = await loop.run_in_executor(disk, _stat_or_none, index_file)
+            if index_st is not None and stat.S_ISREG(index_st.st_mode):
                 fs_target = index_file
+                st = index_st
             else:
-                if not is_safe_path(root_dir, fs_target):
+                if not is_safe_path(root_resolved, fs_target):
                     response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
-                    conn.sendall(response)
+                    writer.write(response)
+                    await writer.drain()
                     return
-                
-                # NAIVE COUNTER UPDATE (RACE CONDITION)
+
                 dir_path = str(fs_target.relative_to(root_dir))
-                # Add VERY aggressive delays to force thread interlacing and make race condition visible
-                print(f"Thread {threading.current_thread().name}: Reading counter for directory {dir_path}")
-                time.sleep(0.5)  # Longer delay before reading
-                current_count = counters.get(dir_path, 0)
-                print(f"Thread {threading.current_thread().name}: Read count {current_count} for {dir_path}")
-                time.sleep(0.5)  # Longer delay before incrementing
-                new_count = current_count + 1
-                print(f"Thread {threading.current_thread().name}: Calculated new count {new_count} for {dir_path}")
-                time.sleep(0.5)  # Longer delay before writing
-                counters[dir_path] = new_count
-                print(f"Thread {threading.current_thread().name}: Wrote count {new_count} for {dir_path}")
-                
+                if RACE_DEMO:
+                    # NAIVE COUNTER UPDATE (RACE CONDITION): the sleeps
+                    # yield to other tasks so the race is reliably visible.
+                    await asyncio.sleep(0.5)
+                    current_count = counters.get(dir_path, 0)
+                    await asyncio.sleep(0.5)
+                    new_count = current_count + 1
+                    await asyncio.sleep(0.5)
+                    counters[dir_path] = new_count
+                    logger.debug("counter %s %d->%d", dir_path, current_count, new_count)
+                else:
+                    _bump(counters, dir_path)
+
                 body = generate_directory_listing(root_dir, fs_target, path if path.endswith("/") else path + "/", counters)
                 headers = {
                     "Date": http_date(),
@@ -160,15 +293,17 @@ def handle_request_naive(conn: socket.socket, client_addr, root_dir: Path, count
                     "Connection": "close",
                 }
                 response = build_http_response(200, "OK", headers, body)
-                conn.sendall(response)
+                writer.write(response)
+                await writer.drain()
                 return
 
-        if not is_safe_path(root_dir, fs_target):
+        if not is_safe_path(root_resolved, fs_target):
             response = build_http_response(403, "Forbidden", {"Date": http_date(), "Connection": "close"}, b"")
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
-        if not fs_target.exists() or not fs_target.is_file():
+        if st is None or not stat.S_ISREG(st.st_mode):
             body = b"404 Not Found"
             headers = {
                 "Date": http_date(),
@@ -177,7 +312,8 @@ def handle_request_naive(conn: socket.socket, client_addr, root_dir: Path, count
                 "Connection": "close",
             }
             response = build_http_response(404, "Not Found", headers, body)
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
         ctype = guess_content_type(fs_target)
@@ -190,73 +326,100 @@ def handle_request_naive(conn: socket.socket, client_addr, root_dir: Path, count
                 "Connection": "close",
             }
             response = build_http_response(404, "Not Found", headers, body)
-            conn.sendall(response)
+            writer.write(response)
+            await writer.drain()
             return
 
-        # NAIVE COUNTER UPDATE (RACE CONDITION)
         file_path = str(fs_target.relative_to(root_dir))
-        # Add VERY aggressive delays to force thread interlacing and make race condition visible
-        print(f"Thread {threading.current_thread().name}: Reading counter for {file_path}")
-        time.sleep(0.5)  # Longer delay before reading
-        current_count = counters.get(file_path, 0)
-        print(f"Thread {threading.current_thread().name}: Read count {current_count} for {file_path}")
-        time.sleep(0.5)  # Longer delay before incrementing
-        new_count = current_count + 1
-        print(f"Thread {threading.current_thread().name}: Calculated new count {new_count} for {file_path}")
-        time.sleep(0.5)  # Longer delay before writing
-        counters[file_path] = new_count
-        print(f"Thread {threading.current_thread().name}: Wrote count {new_count} for {file_path}")
-
-        with open(fs_target, "rb") as f:
-            body = f.read()
-        headers = {
-            "Date": http_date(),
-            "Content-Type": f"{ctype}; charset=utf-8" if ctype.startswith("text/") else ctype,
-            "Content-Length": str(len(body)),
-            "Connection": "close",
-        }
-        response = build_http_response(200, "OK", headers, body)
-        conn.sendall(response)
+        if RACE_DEMO:
+            # NAIVE COUNTER UPDATE (RACE CONDITION): the sleeps yield to
+            # other tasks so the race is reliably visible.
+            await asyncio.sleep(0.5)
+            current_count = counters.get(file_path, 0)
+            await asyncio.sleep(0.5)
+            new_count = current_count + 1
+            await asyncio.sleep(0.5)
+            counters[file_path] = new_count
+            logger.debug("counter %s %d->%d", file_path, current_count, new_count)
+        else:
+            _bump(counters, file_path)
+
+        # The body streams through loop.sendfile so memory stays bounded
+        # regardless of file size; fstat on the open fd gives the length
+        # without a second path lookup.
+        f = await loop.run_in_executor(disk, lambda: open(fs_target, "rb"))
+        try:
+            headers = {
+                "Date": http_date(),
+                "Content-Type": f"{ctype}; charset=utf-8" if ctype.startswith("text/") else ctype,
+                "Content-Length": str(os.fstat(f.fileno()).st_size),
+                "Connection": "close",
+            }
+            writer.write(build_http_response(200, "OK", headers, b""))
+            await writer.drain()
+            await loop.sendfile(writer.transport, f)
+        finally:
+            f.close()
     finally:
         try:
-            conn.close()
+            writer.close()
+            await writer.wait_closed()
         except Exception:
             pass
 
 
-def run_server_naive(root: str, port: int, max_threads: int = 10, simulate_work: bool = False):
-    """Run server with naive counter (demonstrates race condition)"""
+async def serve_naive(root: str, port: int, max_threads: int = 10, simulate_work: bool = False,
+                      reuse_port: bool = False):
     root_dir = Path(root)
     root_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Shared counter WITHOUT lock (race condition)
-    counters = {}
-    
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind(("0.0.0.0", port))
-        s.listen(5)
-        print(f"Serving {root_dir} on 0.0.0.0:{port} (NAIVE COUNTER - RACE CONDITION)")
-        if simulate_work:
-            print("Simulating 1s work per request")
-        
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            while True:
-                conn, addr = s.accept()
-                executor.submit(handle_request_naive, conn, addr, root_dir, counters, simulate_work)
+    root_resolved = str(root_dir.resolve())
+
+    # Shared counter; without RACE_DEMO the C-level Counter increment is
+    # effectively atomic, with RACE_DEMO the naive read-modify-write races.
+    counters = Counter()
+    # Small pool just for blocking open/stat calls so they can't stall the
+    # event loop on slow disks.
+    disk = ThreadPoolExecutor(max_workers=min(max_threads, 8))
+
+    async def handle(reader, writer):
+        await handle_request_naive(reader, writer, root_dir, root_resolved,
+                                   counters, disk, simulate_work)
+
+    server = await asyncio.start_server(handle, "0.0.0.0", port, backlog=1024,
+                                        limit=65536, reuse_port=reuse_port)
+    print(f"Serving {root_dir} on 0.0.0.0:{port} (NAIVE COUNTER - RACE CONDITION)")
+    if simulate_work:
+        print("Simulating 1s work per request")
+    async with server:
+        await server.serve_forever()
+
+
+def run_server_naive(root: str, port: int, max_threads: int = 10, simulate_work: bool = False,
+                     workers: int = 1):
+    """Run server with naive counter (demonstrates race condition)"""
+    # With SO_REUSEPORT each worker process gets its own listening socket and
+    # the kernel load-balances accepted connections across them. Counters are
+    # then per-process.
+    reuse_port = workers > 1 and hasattr(socket, "SO_REUSEPORT")
+    if reuse_port and hasattr(os, "fork"):
+        for _ in range(workers - 1):
+            if os.fork() == 0:
+                break
+    asyncio.run(serve_naive(root, port, max_threads, simulate_work, reuse_port=reuse_port))
 
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python server_race_demo.py <content_dir> [port] [max_threads] [--simulate-work]", file=sys.stderr)
+        print("Usage: python server_race_demo.py <content_dir> [port] [max_threads] [workers] [--simulate-work]", file=sys.stderr)
         sys.exit(1)
-    
+
     content_dir = sys.argv[1]
     port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
     max_threads = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != "--simulate-work" else 10
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4] != "--simulate-work" else 1
     simulate_work = "--simulate-work" in sys.argv
-    
-    run_server_naive(content_dir, port, max_threads, simulate_work)
+
+    run_server_naive(content_dir, port, max_threads, simulate_work, workers)
 
 
 if __name__ == "__main__":
@@ -4,7 +4,9 @@ Follower server for key-value store replication.
 Followers accept replication requests from the leader.
 """
 
+import asyncio
 import os
+import time
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional
@@ -13,16 +15,11 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
-
-# In-memory key-value store
-store = {}
-
 # Configuration
 FOLLOWER_ID = os.getenv('FOLLOWER_ID', 'follower1')
 PORT = int(os.getenv('PORT', '8080'))
 
-logger.info(f"Follower {FOLLOWER_ID} initialized on port {PORT}")
+_MISSING = object()
 
 
 # Pydantic models
@@ -31,82 +28,151 @@ class ReplicateRequest(BaseModel):
     value: str
 
 
-@app.post("/replicate")
-async def replicate(request: ReplicateRequest):
-    """Replicate endpoint - accepts replication requests from leader."""
-    import time
-    receive_time = time.time()
-    
-    try:
-        key = request.key
-        value = request.value
-        
-        # Store the replicated key-value pair
-        # This is where race conditions can occur - multiple concurrent writes
-        store[key] = value
-        
-        logger.info(
-            f"[RACE] Follower {FOLLOWER_ID} replicated key='{key}' "
-            f"at t={receive_time:.3f} (current store size: {len(store)})"
-        )
-        
+class ReplicateBatchRequest(BaseModel):
+    items: list[ReplicateRequest]
+
+
+def create_app(follower_id: str = FOLLOWER_ID) -> FastAPI:
+    """Build one follower app with its own store and writer task.
+
+    A factory rather than module globals so several followers can share a
+    single process (see run_followers.py) without sharing state.
+    """
+    app = FastAPI()
+
+    # In-memory key-value store, private to this app instance
+    store = {}
+
+    logger.info(f"Follower {follower_id} initialized")
+
+    async def _writer(queue: asyncio.Queue):
+        # Single-writer actor: only this task ever mutates `store`, so writes
+        # need no lock at all - contention is structurally impossible. Each
+        # queue entry carries a list of pairs so batches apply atomically.
+        while True:
+            items, fut = await queue.get()
+            for key, value in items:
+                store[key] = value
+            if not fut.done():
+                fut.set_result(True)
+            queue.task_done()
+
+    @app.on_event("startup")
+    async def start_writer():
+        app.state.write_q = asyncio.Queue()
+        app.state.writer_task = asyncio.create_task(_writer(app.state.write_q))
+
+    @app.on_event("shutdown")
+    async def stop_writer():
+        app.state.writer_task.cancel()
+
+    @app.post("/replicate")
+    async def replicate(request: ReplicateRequest):
+        """Replicate endpoint - accepts replication requests from leader."""
+        receive_time = time.time()
+
+        try:
+            key = request.key
+            value = request.value
+
+            # Hand the write to the single-writer task and wait for it to be
+            # applied. Concurrent replications for the same key still land in
+            # arrival order - that is the race the lab demonstrates.
+            fut = asyncio.get_running_loop().create_future()
+            await app.state.write_q.put(([(key, value)], fut))
+            await fut
+
+            logger.info(
+                f"[RACE] Follower {follower_id} replicated key='{key}' "
+                f"at t={receive_time:.3f} (current store size: {len(store)})"
+            )
+
+            return {
+                "success": True,
+                "key": key,
+                "value": value,
+                "follower_id": follower_id,
+                "timestamp": receive_time
+            }
+
+        except Exception as e:
+            logger.error(f"Error in replicate: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.post("/replicate_batch")
+    async def replicate_batch(request: ReplicateBatchRequest):
+        """Batched replication - one request carries a coalesced write batch."""
+        try:
+            fut = asyncio.get_running_loop().create_future()
+            await app.state.write_q.put(
+                ([(item.key, item.value) for item in request.items], fut)
+            )
+            await fut
+            return {
+                "success": True,
+                "count": len(request.items),
+                "follower_id": follower_id,
+                "timestamp": time.time(),
+            }
+        except Exception as e:
+            logger.error(f"Error in replicate_batch: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/read")
+    async def read(key: Optional[str] = None):
+        """Read endpoint - reads from local store."""
+        if key is None:
+            raise HTTPException(status_code=400, detail="key parameter is required")
+
+        # Single dict lookup; the sentinel distinguishes a missing key from a
+        # stored falsy value.
+        value = store.get(key, _MISSING)
+        if value is _MISSING:
+            raise HTTPException(status_code=404, detail="key not found")
+        return {"key": key, "value": value}
+
+    @app.get("/health")
+    async def health():
+        """Health check endpoint."""
         return {
-            "success": True,
-            "key": key,
-            "value": value,
-            "follower_id": FOLLOWER_ID,
-            "timestamp": receive_time
+            "status": "healthy",
+            "role": "follower",
+            "follower_id": follower_id,
+            "store_size": len(store)
         }
-        
-    except Exception as e:
-        logger.error(f"Error in replicate: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.get("/read")
-async def read(key: Optional[str] = None):
-    """Read endpoint - reads from local store."""
-    if key is None:
-        raise HTTPException(status_code=400, detail="key parameter is required")
-    
-    if key in store:
-        return {"key": key, "value": store[key]}
-    else:
-        raise HTTPException(status_code=404, detail="key not found")
-
-
-@app.get("/health")
-async def health():
-    """Health check endpoint."""
-    return {
-        "status": "healthy",
-        "role": "follower",
-        "follower_id": FOLLOWER_ID,
-        "store_size": len(store)
-    }
-
-
-@app.get("/store")
-async def get_store():
-    """Get entire store (for testing/verification)."""
-    return store
-
-
-@app.get("/")
-async def root():
-    """Root endpoint - shows available endpoints."""
-    return {
-        "message": f"Key-Value Store Follower API ({FOLLOWER_ID})",
-        "endpoints": {
-            "POST /replicate": "Internal endpoint for replication (called by leader)",
-            "GET /read?key=<key>": "Read a value by key",
-            "GET /health": "Health check",
-            "GET /store": "Get entire store",
-            "GET /docs": "FastAPI interactive documentation"
+
+    @app.get("/store")
+    async def get_store():
+        """Get entire store (for testing/verification)."""
+        return store
+
+    @app.get("/")
+    async def root():
+        """Root endpoint - shows available endpoints."""
+        return {
+            "message": f"Key-Value Store Follower API ({follower_id})",
+            "endpoints": {
+                "POST /replicate": "Internal endpoint for replication (called by leader)",
+                "GET /read?key=<key>": "Read a value by key",
+                "GET /health": "Health check",
+                "GET /store": "Get entire store",
+                "GET /docs": "FastAPI interactive documentation"
+            }
         }
-    }
+
+    return app
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
     import uvicorn
-    uvicorn.run(app, host='0.0.0.0', port=PORT)
+    # uvloop's C event loop and the httptools parser roughly double async
+    # HTTP throughput; fall back to the defaults where they aren't built.
+    try:
+        import uvloop  # noqa: F401
+        loop_impl, http_impl = 'uvloop', 'httptools'
+    except ImportError:
+        loop_impl, http_impl = 'auto', 'auto'
+    uvicorn.run(app, host='0.0.0.0', port=PORT, loop=loop_impl, http=http_impl)
@@ -9,104 +9,342 @@ import time
 import random
 import asyncio
 import aiohttp
+import numpy as np
+import orjson
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List, Dict, Any
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# orjson serializes every response; C-level JSON instead of stdlib json.
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # In-memory key-value store
 store = {}
+_MISSING = object()
 
 # Configuration from environment variables
 FOLLOWERS = os.getenv('FOLLOWERS', '').split(',')
 FOLLOWERS = [f.strip() for f in FOLLOWERS if f.strip()]
+# Follower display ids are a pure function of config; parse them once
+# instead of splitting the URL on every replication call.
+FOLLOWER_IDS = [f.split(':')[-1] if ':' in f else f for f in FOLLOWERS]
+FOLLOWER_ID_BY_URL = dict(zip(FOLLOWERS, FOLLOWER_IDS))
 WRITE_QUORUM = int(os.getenv('WRITE_QUORUM', '3'))
 MIN_DELAY = int(os.getenv('MIN_DELAY', '0'))
 MAX_DELAY = int(os.getenv('MAX_DELAY', '1000'))
+# Per-follower connection pool size; raise it if concurrent writes exceed 32.
+FOLLOWER_POOL_SIZE = int(os.getenv('FOLLOWER_POOL_SIZE', '32'))
+# Write coalescing: BATCH_WINDOW_US > 0 routes quorum writes through a
+# batcher that merges concurrent writes into one /replicate_batch POST per
+# follower. Off by default - batching hides the per-write races this lab
+# demonstrates.
+BATCH_WINDOW_US = int(os.getenv('BATCH_WINDOW_US', '0'))
+BATCH_MAX = int(os.getenv('BATCH_MAX', '64'))
+# Cap on simultaneously in-flight replication POSTs across all followers;
+# excess calls queue on the semaphore instead of piling onto the connector.
+MAX_INFLIGHT_REPLICATIONS = int(os.getenv('MAX_INFLIGHT_REPLICATIONS', '256'))
+
+# Instance-local RNG: avoids the module-level random lock shared with any
+# other random users in the process.
+_rng = random.Random()
+_np_rng = np.random.default_rng()
+
+# aiohttp's json= kwarg would re-encode with stdlib json per call; payloads
+# are orjson-encoded bytes with this constant header instead.
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# ClientTimeout is immutable; one instance serves every replication POST.
+REPLICATE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+# Strong references to in-flight replication tasks. Tasks spawned here are
+# owned by the module, not the request: a client disconnect cancels the
+# handler but never the stragglers still replicating, and the set keeps
+# them alive until their done-callback discards them.
+background_tasks: set = set()
+
+REPLICATION_SEM = asyncio.Semaphore(MAX_INFLIGHT_REPLICATIONS)
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def _draw_delays_random() -> list:
+    """One delay per follower, drawn as a single vectorized numpy call."""
+    return _np_rng.integers(MIN_DELAY, MAX_DELAY + 1, size=len(FOLLOWERS)).tolist()
+
+
+def _draw_delays_fixed() -> list:
+    return [MIN_DELAY] * len(FOLLOWERS)
+
+
+# The delay range is fixed at startup, so bind the right generator once
+# instead of re-checking MIN==MAX on every write.
+_draw_delays = _draw_delays_fixed if MIN_DELAY == MAX_DELAY else _draw_delays_random
 
 logger.info(f"Leader initialized with {len(FOLLOWERS)} followers: {FOLLOWERS}")
 logger.info(f"Write quorum: {WRITE_QUORUM}, Delay range: [{MIN_DELAY}, {MAX_DELAY}]ms")
 
 
-# Pydantic models for request/response
+# Pydantic request model; responses are plain dicts so the return path
+# skips model validation entirely.
 class WriteRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     key: str
     value: str
 
 
-class WriteResponse(BaseModel):
-    success: bool
-    key: str
-    value: str
-    confirmations: int
-    quorum_met: bool
-    latency_ms: float
-    replication_results: list
+class WriteBatchRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    writes: List[WriteRequest]
+
+
+class SetQuorumRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    value: int
+
+
+@app.on_event("startup")
+async def create_session():
+    # One session per follower for the leader's lifetime: each follower gets
+    # its own keep-alive pool and connector slots, so a slow follower queues
+    # only against its own pool instead of starving the healthy ones.
+    app.state.sessions = {
+        follower: aiohttp.ClientSession(
+            base_url=follower,
+            connector=aiohttp.TCPConnector(
+                limit=FOLLOWER_POOL_SIZE,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            ),
+        )
+        for follower in FOLLOWERS
+    }
+    # Background (fire-and-forget) replications go through a bounded queue
+    # drained by a fixed worker pool, so slow followers exert back-pressure
+    # instead of piling up unowned tasks.
+    app.state.repl_queue = asyncio.Queue(maxsize=10_000)
+    app.state.repl_workers = [
+        asyncio.create_task(_replication_worker(app.state.repl_queue))
+        for _ in range(max(2, len(FOLLOWERS) * 2))
+    ]
+    app.state.batch_queue = None
+    app.state.batcher_task = None
+    if BATCH_WINDOW_US > 0:
+        app.state.batch_queue = asyncio.Queue()
+        app.state.batcher_task = asyncio.create_task(_batcher(app.state.batch_queue))
+
 
+@app.on_event("shutdown")
+async def close_session():
+    for worker in app.state.repl_workers:
+        worker.cancel()
+    if app.state.batcher_task is not None:
+        app.state.batcher_task.cancel()
+    for session in app.state.sessions.values():
+        await session.close()
 
-async def replicate_to_follower(follower_url: str, key: str, value: str, delay_ms: int) -> Dict[str, Any]:
+
+async def _replication_worker(queue: asyncio.Queue):
+    while True:
+        follower, key, value, delay = await queue.get()
+        try:
+            await replicate_to_follower(app.state.sessions[follower],
+                                        follower, FOLLOWER_ID_BY_URL[follower],
+                                        key, value, delay)
+        except Exception as e:
+            logger.error(f"Background replication to {follower} failed: {e}")
+        finally:
+            queue.task_done()
+
+
+async def replicate_batch_to_follower(session: aiohttp.ClientSession, follower_url: str,
+                                      items: List[Dict[str, str]], delay_ms: int) -> bool:
+    """POST one coalesced batch to a follower; True on confirmation."""
+    await asyncio.sleep(delay_ms / 1000.0)
+    try:
+        async with REPLICATION_SEM:
+            async with session.post(
+                "/replicate_batch",
+                data=orjson.dumps({"items": items}),
+                headers=_JSON_HEADERS,
+                timeout=REPLICATE_TIMEOUT
+            ) as response:
+                return response.status == 200
+    except Exception as e:
+        logger.error(f"Batch replication to {follower_url} failed: {e}")
+        return False
+
+
+async def _batcher(queue: asyncio.Queue):
+    """Coalesce concurrent writes into one replication fan-out per batch.
+
+    K writes landing within the window cost N follower requests total
+    instead of K*N; every write in the batch shares the follower
+    confirmations and resolves with the same quorum result.
+    """
+    window = BATCH_WINDOW_US / 1_000_000
+    while True:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + window
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        start_time = time.time()
+        items = [{"key": key, "value": value} for key, value, _ in batch]
+        store.update((key, value) for key, value, _ in batch)
+
+        delays = _draw_delays()
+        tasks = [
+            _spawn(replicate_batch_to_follower(app.state.sessions[follower], follower, items, delay))
+            for follower, delay in zip(FOLLOWERS, delays)
+        ]
+        successful_count = 0
+        pending = set(tasks)
+        while pending and successful_count < WRITE_QUORUM:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            successful_count += sum(1 for task in done if task.result())
+
+        latency = (time.time() - start_time) * 1000
+        result = (successful_count + 1, successful_count >= WRITE_QUORUM, latency)
+        for _, _, fut in batch:
+            if not fut.done():
+                fut.set_result(result)
+        for _ in batch:
+            queue.task_done()
+
+
+async def replicate_to_follower(session: aiohttp.ClientSession, follower_url: str,
+                                follower_id: str, key: str, value: str,
+                                delay_ms: int) -> Dict[str, Any]:
     """Replicate a key-value pair to a single follower with delay.
     
     Returns a coroutine that, when awaited, returns a dict with replication result.
     The delay simulates network latency and processing time.
     """
-    start_time = time.time()
-    follower_id = follower_url.split(':')[-1] if ':' in follower_url else follower_url
-    
-    # Log when replication starts (shows race condition - all start concurrently)
-    logger.info(f"[RACE] Starting replication to {follower_id} for key='{key}' with delay={delay_ms}ms")
-    
+    loop = asyncio.get_running_loop()
+    # loop.time() is monotonic and cheaper than time.time(); one stamp at
+    # entry and one per outcome is all the result dict needs.
+    start_time = loop.time()
+
+    # Log when replication starts (shows race condition - all start
+    # concurrently). %-style args defer formatting until the record is
+    # actually emitted.
+    logger.info("[RACE] Starting replication to %s for key='%s' with delay=%dms",
+                follower_id, key, delay_ms)
+
     # Apply delay BEFORE network call to simulate network latency
     # This creates visible race conditions as different followers respond at different times
     await asyncio.sleep(delay_ms / 1000.0)  # Convert ms to seconds
-    
-    elapsed_before_network = (time.time() - start_time) * 1000
-    
+
+    return await _replicate_now(session, follower_url, follower_id, key, value,
+                                delay_ms, start_time)
+
+
+def _fanout_staggered(sessions, key: str, value: str, delays: list) -> list:
+    """Start the replication fan-out; returns one future per follower.
+
+    Instead of N coroutines each parked on its own asyncio.sleep (N timer
+    heap entries per write), a single coordinator walks the followers in
+    delay order, sleeping only the increment to the next one and firing
+    the network POST at each step.
+    """
+    loop = asyncio.get_running_loop()
+    futures = [loop.create_future() for _ in FOLLOWERS]
+    _spawn(_stagger_coordinator(sessions, key, value, delays, futures))
+    return futures
+
+
+async def _stagger_coordinator(sessions, key: str, value: str,
+                               delays: list, futures: list):
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    elapsed_ms = 0
+    for i in sorted(range(len(FOLLOWERS)), key=delays.__getitem__):
+        delay_ms = delays[i]
+        if delay_ms > elapsed_ms:
+            await asyncio.sleep((delay_ms - elapsed_ms) / 1000.0)
+            elapsed_ms = delay_ms
+        task = _spawn(_replicate_now(sessions[FOLLOWERS[i]], FOLLOWERS[i],
+                                     FOLLOWER_IDS[i], key, value, delay_ms,
+                                     start_time))
+        task.add_done_callback(
+            lambda t, fut=futures[i]: fut.done() or fut.set_result(t.result())
+        )
+
+
+async def _replicate_now(session: aiohttp.ClientSession, follower_url: str,
+                         follower_id: str, key: str, value: str,
+                         delay_ms: int, start_time: float) -> Dict[str, Any]:
+    """The network half of a replication: POST now, delay already served."""
+    loop = asyncio.get_running_loop()
+    async with REPLICATION_SEM:
+        return await _replicate_post(session, follower_url, follower_id, key,
+                                     value, delay_ms, start_time, loop)
+
+
+async def _replicate_post(session, follower_url, follower_id, key, value,
+                          delay_ms, start_time, loop):
     try:
-        async with aiohttp.ClientSession() as session:
-            network_start = time.time()
-            async with session.post(
-                f"{follower_url}/replicate",
-                json={"key": key, "value": value},
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as response:
-                network_time = (time.time() - network_start) * 1000
-                total_time = (time.time() - start_time) * 1000
-                
-                if response.status == 200:
-                    result = await response.json()
+        network_start = loop.time()
+        async with session.post(
+            "/replicate",
+            data=orjson.dumps({"key": key, "value": value}),
+            headers=_JSON_HEADERS,
+            timeout=REPLICATE_TIMEOUT
+        ) as response:
+            total_time = (loop.time() - start_time) * 1000
+
+            if response.status == 200:
+                result = orjson.loads(await response.read())
+                if logger.isEnabledFor(logging.INFO):
                     logger.info(
-                        f"[RACE] ✓ {follower_id} confirmed key='{key}' "
-                        f"(delay={delay_ms}ms, network={network_time:.1f}ms, total={total_time:.1f}ms)"
+                        "[RACE] ✓ %s confirmed key='%s' (delay=%dms, network=%.1fms, total=%.1fms)",
+                        follower_id, key, delay_ms,
+                        (loop.time() - network_start) * 1000, total_time,
                     )
-                    return {
-                        "success": True,
-                        "follower": follower_url,
-                        "follower_id": follower_id,
-                        "result": result,
-                        "delay_ms": delay_ms,
-                        "total_time_ms": total_time,
-                        "timestamp": time.time()
-                    }
-                else:
-                    logger.warning(f"[RACE] ✗ {follower_id} failed for key='{key}': Status {response.status}")
-                    return {"success": False, "follower": follower_url, "follower_id": follower_id, "error": f"Status {response.status}"}
+                return {
+                    "success": True,
+                    "follower": follower_url,
+                    "follower_id": follower_id,
+                    "result": result,
+                    "delay_ms": delay_ms,
+                    "total_time_ms": total_time,
+                    "timestamp": time.time()
+                }
+            else:
+                logger.warning("[RACE] ✗ %s failed for key='%s': Status %s",
+                               follower_id, key, response.status)
+                return {"success": False, "follower": follower_url, "follower_id": follower_id, "error": f"Status {response.status}"}
     except asyncio.TimeoutError:
-        total_time = (time.time() - start_time) * 1000
-        logger.warning(f"[RACE] ✗ {follower_id} timeout for key='{key}' after {total_time:.1f}ms")
+        total_time = (loop.time() - start_time) * 1000
+        logger.warning("[RACE] ✗ %s timeout for key='%s' after %.1fms",
+                       follower_id, key, total_time)
         return {"success": False, "follower": follower_url, "follower_id": follower_id, "error": "Timeout"}
     except Exception as e:
-        total_time = (time.time() - start_time) * 1000
-        logger.error(f"[RACE] ✗ {follower_id} error for key='{key}': {e}")
+        logger.error("[RACE] ✗ %s error for key='%s': %s", follower_id, key, e)
         return {"success": False, "follower": follower_url, "follower_id": follower_id, "error": str(e)}
 
 
-@app.post("/write", response_model=WriteResponse)
+@app.post("/write")
 async def write(request: WriteRequest):
     """Write endpoint - only leader accepts writes."""
     try:
@@ -114,7 +352,24 @@ async def write(request: WriteRequest):
         value = request.value
         
         start_time = time.time()
-        
+        sessions = app.state.sessions
+
+        # Coalesced path: hand the write to the batcher and await the shared
+        # quorum result for its batch (the batcher applies it to the store).
+        if app.state.batch_queue is not None and FOLLOWERS and 0 < WRITE_QUORUM <= len(FOLLOWERS):
+            fut = asyncio.get_running_loop().create_future()
+            await app.state.batch_queue.put((key, value, fut))
+            confirmations, quorum_met, latency = await fut
+            return {
+                "success": True,
+                "key": key,
+                "value": value,
+                "confirmations": confirmations,
+                "quorum_met": quorum_met,
+                "latency_ms": latency,
+                "replication_results": [],
+            }
+
         # Write to local store (leader always writes locally first)
         store[key] = value
         
@@ -139,100 +394,110 @@ async def write(request: WriteRequest):
             replication_results = []
             
             # Still replicate to followers in background (don't wait)
-            delays = [random.randint(MIN_DELAY, MAX_DELAY) for _ in FOLLOWERS]
+            delays = _draw_delays()
             for follower, delay in zip(FOLLOWERS, delays):
-                asyncio.create_task(replicate_to_follower(follower, key, value, delay))
+                try:
+                    app.state.repl_queue.put_nowait((follower, key, value, delay))
+                except asyncio.QueueFull:
+                    # Bounded-backlog policy: drop the newest replication and
+                    # say so, rather than letting the queue grow without limit.
+                    logger.warning(
+                        "Replication backlog full; dropping write of key='%s' to %s",
+                        key, follower,
+                    )
         elif required_follower_confirmations > len(FOLLOWERS):
             # Can't meet quorum - not enough followers
             logger.warning(
-                f"[QUORUM] Cannot meet quorum {WRITE_QUORUM}: only {len(FOLLOWERS)} followers available"
+                "[QUORUM] Cannot meet quorum %d: only %d followers available",
+                WRITE_QUORUM, len(FOLLOWERS),
             )
             latency = (time.time() - start_time) * 1000
             quorum_met = False
             total_confirmations = 1  # Only leader
             replication_results = []
             
-            # Still try to replicate to all followers
-            delays = [random.randint(MIN_DELAY, MAX_DELAY) for _ in FOLLOWERS]
-            tasks = [
-                asyncio.create_task(replicate_to_follower(follower, key, value, delay))
-                for follower, delay in zip(FOLLOWERS, delays)
-            ]
-            # Wait for all (but quorum won't be met)
-            for coro in asyncio.as_completed(tasks):
-                try:
-                    result = await coro
-                    replication_results.append(result)
-                except Exception as e:
-                    replication_results.append({"success": False, "error": str(e)})
+            # Still try to replicate to all followers. This branch waits for
+            # everything anyway, so a TaskGroup owns the tasks directly -
+            # no as_completed wrapper future per completion - and
+            # replicate_to_follower reports failures as result dicts.
+            delays = _draw_delays()
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(replicate_to_follower(sessions[follower], follower, fid, key, value, delay))
+                    for follower, fid, delay in zip(FOLLOWERS, FOLLOWER_IDS, delays)
+                ]
+            replication_results = [task.result() for task in tasks]
         else:
             # Q>=1: Need to wait for follower confirmations
             # Generate random delays for each follower (this creates race conditions)
-            delays = [random.randint(MIN_DELAY, MAX_DELAY) for _ in FOLLOWERS]
+            delays = _draw_delays()
             
-            logger.info(
-                f"[QUORUM] Write key='{key}': Need {required_follower_confirmations} follower confirmations "
-                f"(quorum={WRITE_QUORUM} followers + 1 leader = {required_follower_confirmations + 1} total). "
-                f"Delays: {dict(zip([f.split(':')[-1] for f in FOLLOWERS], delays))}"
-            )
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "[QUORUM] Write key='%s': Need %d follower confirmations "
+                    "(quorum=%d followers + 1 leader = %d total). Delays: %s",
+                    key, required_follower_confirmations, WRITE_QUORUM,
+                    required_follower_confirmations + 1, delays,
+                )
             
             # Start replication to all followers concurrently
             # This creates a race condition - all followers start at the same time
             # but finish at different times based on their delays
-            tasks = [
-                asyncio.create_task(replicate_to_follower(follower, key, value, delay))
-                for follower, delay in zip(FOLLOWERS, delays)
-            ]
+            tasks = _fanout_staggered(sessions, key, value, delays)
             
             # Wait for enough confirmations (semi-synchronous)
             replication_results = []
             successful_count = 0
             quorum_met = False
             
-            # Process results as they complete
-            # asyncio.as_completed returns tasks in order of completion (fastest first)
-            # This shows the race condition - fastest followers respond first
+            # Process results in completion batches: asyncio.wait hands back
+            # whatever finished first, so fastest followers count first and
+            # the loop stops tracking the slow tail once quorum is reached.
             responses_received = 0
             completion_order = []
-            
-            for coro in asyncio.as_completed(tasks):
-                try:
-                    result = await coro
+            pending = set(tasks)
+
+            while pending and not quorum_met:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        responses_received += 1
+                        replication_results.append({"success": False, "error": str(e)})
+                        logger.error(f"[QUORUM] Error processing replication result: {e}")
+                        continue
                     responses_received += 1
                     replication_results.append(result)
-                    
+
                     if result.get('success', False):
                         successful_count += 1
                         follower_id = result.get('follower_id', 'unknown')
                         completion_order.append(follower_id)
                         logger.info(
-                            f"[QUORUM] Confirmation #{successful_count}/{required_follower_confirmations} "
-                            f"from {follower_id} (order: {completion_order})"
+                            "[QUORUM] Confirmation #%d/%d from %s",
+                            successful_count, required_follower_confirmations, follower_id,
                         )
-                    
+
                     # Check if we have enough confirmations
                     # We need WRITE_QUORUM successful follower responses (leader already counted)
-                    if successful_count >= required_follower_confirmations:
+                    if successful_count >= required_follower_confirmations and not quorum_met:
                         # Quorum met! Record latency NOW and return
                         latency = (time.time() - start_time) * 1000
                         quorum_met = True
                         total_confirmations = successful_count + 1  # +1 for leader
-                        
+
                         logger.info(
-                            f"[QUORUM] ✓ Quorum MET: {successful_count} followers + 1 leader = "
-                            f"{total_confirmations} total confirmations (required: {WRITE_QUORUM} followers + 1 leader). "
-                            f"Latency={latency:.2f}ms. "
-                            f"Completion order: {completion_order} "
-                            f"({responses_received}/{len(FOLLOWERS)} responses received)"
+                            "[QUORUM] ✓ Quorum MET: %d followers + 1 leader = %d total "
+                            "confirmations (required: %d followers + 1 leader). "
+                            "Latency=%.2fms. Completion order: %s (%d/%d responses received)",
+                            successful_count, total_confirmations, WRITE_QUORUM,
+                            latency, completion_order, responses_received, len(FOLLOWERS),
                         )
-                        
-                        # Don't wait for remaining - return immediately
-                        # (remaining tasks will complete in background, showing race condition)
-                        break
-                except Exception as e:
-                    responses_received += 1
-                    replication_results.append({"success": False, "error": str(e)})
-                    logger.error(f"[QUORUM] Error processing replication result: {e}")
+
+                        # Don't wait (or cancel) the remaining tasks - they
+                        # keep replicating in the background, showing the
+                        # race condition / eventual consistency.
             
             # If we didn't meet quorum (shouldn't happen with enough followers)
             if not quorum_met:
@@ -240,53 +505,71 @@ async def write(request: WriteRequest):
                 total_confirmations = successful_count + 1  # +1 for leader
                 quorum_met = successful_count >= required_follower_confirmations
                 logger.warning(
-                    f"[QUORUM] ✗ Quorum NOT met: got {successful_count} follower confirmations "
-                    f"(needed {required_follower_confirmations}) + 1 leader = {total_confirmations} total"
+                    "[QUORUM] ✗ Quorum NOT met: got %d follower confirmations "
+                    "(needed %d) + 1 leader = %d total",
+                    successful_count, required_follower_confirmations, total_confirmations,
                 )
         
-        if quorum_met:
-            return WriteResponse(
-                success=True,
-                key=key,
-                value=value,
-                confirmations=total_confirmations,
-                quorum_met=True,
-                latency_ms=latency,
-                replication_results=replication_results
-            )
-        else:
-            # Write succeeded locally but didn't get enough confirmations for quorum
-            # In strict semi-synchronous replication, we might wait longer or fail,
-            # but for this lab we'll return success but indicate quorum wasn't met
-            logger.warning(
-                f"Write quorum not met: got {total_confirmations} confirmations, "
-                f"needed {WRITE_QUORUM}"
-            )
-            return WriteResponse(
-                success=True,  # Still return success as write is in leader
-                key=key,
-                value=value,
-                confirmations=total_confirmations,
-                quorum_met=False,
-                latency_ms=latency,
-                replication_results=replication_results
-            )
+        # Single exit for every branch: the write always succeeds on the
+        # leader, and quorum_met carries the semi-synchronous outcome. The
+        # not-met branches warned above already.
+        return {
+            "success": True,
+            "key": key,
+            "value": value,
+            "confirmations": total_confirmations,
+            "quorum_met": quorum_met,
+            "latency_ms": latency,
+            "replication_results": replication_results,
+        }
             
     except Exception as e:
         logger.error(f"Error in write: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/write_batch")
+async def write_batch(request: WriteBatchRequest):
+    """Batched writes: one HTTP round trip carries many /write operations.
+
+    Each item runs through the same quorum path concurrently; the response
+    is the per-item result list in request order.
+    """
+    results = await asyncio.gather(*(write(item) for item in request.writes))
+    return {"results": results}
+
+
+@app.post("/admin/set_write_quorum")
+async def set_write_quorum(request: SetQuorumRequest):
+    """Change WRITE_QUORUM in the running process.
+
+    Lets test harnesses sweep quorum values without a container recreate
+    per value. A single int reassignment on the one event loop is atomic;
+    in-flight writes finish under the quorum they started with.
+    """
+    global WRITE_QUORUM
+    if request.value < 0 or request.value > len(FOLLOWERS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"quorum must be between 0 and {len(FOLLOWERS)}"
+        )
+    WRITE_QUORUM = request.value
+    logger.info("[ADMIN] WRITE_QUORUM set to %d", WRITE_QUORUM)
+    return {"write_quorum": WRITE_QUORUM}
+
+
 @app.get("/read")
 async def read(key: Optional[str] = None):
     """Read endpoint - reads from local store."""
     if key is None:
         raise HTTPException(status_code=400, detail="key parameter is required")
     
-    if key in store:
-        return {"key": key, "value": store[key]}
-    else:
+    # Single dict lookup; the sentinel distinguishes a missing key from a
+    # stored falsy value.
+    value = store.get(key, _MISSING)
+    if value is _MISSING:
         raise HTTPException(status_code=404, detail="key not found")
+    return {"key": key, "value": value}
 
 
 @app.get("/health")
@@ -326,4 +609,12 @@ async def root():
 if __name__ == '__main__':
     import uvicorn
     port = int(os.getenv('PORT', '8080'))
-    uvicorn.run(app, host='0.0.0.0', port=port)
+    # uvloop's C event loop and the httptools parser roughly double async
+    # HTTP throughput; fall back to the defaults where they aren't built.
+    try:
+        import uvloop  # noqa: F401
+        loop_impl, http_impl = 'uvloop', 'httptools'
+    except ImportError:
+        loop_impl, http_impl = 'auto', 'auto'
+    uvicorn.run(app, host='0.0.0.0', port=port, loop=loop_impl, http=http_impl,
+                log_level='warning')
@@ -1,61 +1,43 @@
 #!/usr/bin/env python3
 """
 Script to run all 5 followers in a single container.
-Each follower runs on a different port using separate processes.
+One process, one event loop: each follower is its own app instance on its
+own port, multiplexed by asyncio instead of five full interpreters.
 """
 
-import os
-import multiprocessing
+import asyncio
 import uvicorn
 import logging
 import sys
 
+from follower import create_app
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Configuration for 5 followers
+FOLLOWERS_CONFIG = [
+    (8081, 'follower1'),
+    (8082, 'follower2'),
+    (8083, 'follower3'),
+    (8084, 'follower4'),
+    (8085, 'follower5'),
+]
+
 
-def run_follower(port: int, follower_id: str):
-    """Run a single follower instance in a separate process."""
-    # Set environment variables for this process
-    os.environ['PORT'] = str(port)
-    os.environ['FOLLOWER_ID'] = follower_id
-    
-    # Import here - each process gets its own module instance
-    from follower import app
-    
-    logger.info(f"Starting follower {follower_id} on port {port}")
-    config = uvicorn.Config(app, host='0.0.0.0', port=port, log_level='info')
-    server = uvicorn.Server(config)
-    server.run()
+async def main():
+    servers = []
+    for port, follower_id in FOLLOWERS_CONFIG:
+        config = uvicorn.Config(create_app(follower_id), host='0.0.0.0',
+                                port=port, log_level='info')
+        servers.append(uvicorn.Server(config))
+        logger.info(f"Starting follower {follower_id} on port {port}")
+    await asyncio.gather(*(server.serve() for server in servers))
 
 
 if __name__ == '__main__':
-    # Configuration for 5 followers
-    followers_config = [
-        (8081, 'follower1'),
-        (8082, 'follower2'),
-        (8083, 'follower3'),
-        (8084, 'follower4'),
-        (8085, 'follower5'),
-    ]
-    
-    # Start each follower in a separate process
-    processes = []
-    for port, follower_id in followers_config:
-        p = multiprocessing.Process(target=run_follower, args=(port, follower_id))
-        p.start()
-        processes.append(p)
-        logger.info(f"Started process for {follower_id} on port {port}")
-    
-    # Wait for all processes
     try:
-        for p in processes:
-            p.join()
+        asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Shutting down followers...")
-        for p in processes:
-            p.terminate()
-        for p in processes:
-            p.join()
         sys.exit(0)
-
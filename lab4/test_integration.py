@@ -3,7 +3,8 @@
 Integration test for the key-value store with replication.
 """
 
-import requests
+import asyncio
+import httpx
 import time
 import json
 import os
@@ -17,15 +18,22 @@ FOLLOWERS = [
     'http://localhost:8085'
 ]
 
+# One pooled client for the whole suite: requests are keep-alive-reused
+# instead of paying a TCP handshake per call.
+CLIENT = httpx.Client(
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    timeout=10,
+)
+
 
 def wait_for_service(url, max_retries=30, delay=1):
     """Wait for a service to become available."""
     for i in range(max_retries):
         try:
-            response = requests.get(f"{url}/health", timeout=2)
+            response = CLIENT.get(f"{url}/health", timeout=2)
             if response.status_code == 200:
                 return True
-        except requests.exceptions.RequestException:
+        except httpx.HTTPError:
             pass
         time.sleep(delay)
     return False
@@ -37,7 +45,7 @@ def test_health_checks():
     
     # Check leader
     assert wait_for_service(LEADER_URL), "Leader not available"
-    response = requests.get(f"{LEADER_URL}/health")
+    response = CLIENT.get(f"{LEADER_URL}/health")
     assert response.status_code == 200
     data = response.json()
     assert data['role'] == 'leader'
@@ -46,7 +54,7 @@ def test_health_checks():
     # Check followers
     for follower_url in FOLLOWERS:
         assert wait_for_service(follower_url), f"Follower {follower_url} not available"
-        response = requests.get(f"{follower_url}/health")
+        response = CLIENT.get(f"{follower_url}/health")
         assert response.status_code == 200
         data = response.json()
         assert data['role'] == 'follower'
@@ -63,7 +71,7 @@ def test_write_and_replication():
     key = "test_key_1"
     value = "test_value_1"
     
-    response = requests.post(
+    response = CLIENT.post(
         f"{LEADER_URL}/write",
         json={"key": key, "value": value},
         timeout=10
@@ -80,14 +88,14 @@ def test_write_and_replication():
     time.sleep(2)
     
     # Check that the value is in the leader
-    response = requests.get(f"{LEADER_URL}/read", params={"key": key})
+    response = CLIENT.get(f"{LEADER_URL}/read", params={"key": key})
     assert response.status_code == 200
     assert response.json()['value'] == value
     print(f"✓ Value found in leader")
     
     # Check that the value is replicated to followers
     for follower_url in FOLLOWERS:
-        response = requests.get(f"{follower_url}/read", params={"key": key}, timeout=2)
+        response = CLIENT.get(f"{follower_url}/read", params={"key": key}, timeout=2)
         if response.status_code == 200:
             assert response.json()['value'] == value
             print(f"✓ Value replicated to {follower_url}")
@@ -101,16 +109,18 @@ def test_multiple_writes():
     """Test multiple writes."""
     print("Testing multiple writes...")
     
-    for i in range(10):
-        key = f"key_{i}"
-        value = f"value_{i}"
-        
-        response = requests.post(
-            f"{LEADER_URL}/write",
-            json={"key": key, "value": value},
-            timeout=10
-        )
-        
+    async def _write_all():
+        # Fire the 10 writes concurrently over one pooled async client;
+        # the run is bounded by the slowest quorum, not 10 sequential RTTs.
+        async with httpx.AsyncClient(timeout=10) as client:
+            return await asyncio.gather(*(
+                client.post(f"{LEADER_URL}/write",
+                            json={"key": f"key_{i}", "value": f"value_{i}"})
+                for i in range(10)
+            ))
+
+    responses = asyncio.run(_write_all())
+    for i, response in enumerate(responses):
         assert response.status_code == 200, f"Write {i} failed: {response.text}"
         print(f"✓ Write {i} successful")
     
@@ -123,14 +133,14 @@ def test_multiple_writes():
         expected_value = f"value_{i}"
         
         # Check leader
-        response = requests.get(f"{LEADER_URL}/read", params={"key": key})
+        response = CLIENT.get(f"{LEADER_URL}/read", params={"key": key})
         assert response.status_code == 200
         assert response.json()['value'] == expected_value
         
         # Check at least some followers have the value
         follower_count = 0
         for follower_url in FOLLOWERS:
-            response = requests.get(f"{follower_url}/read", params={"key": key}, timeout=2)
+            response = CLIENT.get(f"{follower_url}/read", params={"key": key}, timeout=2)
             if response.status_code == 200 and response.json()['value'] == expected_value:
                 follower_count += 1
         
@@ -143,7 +153,7 @@ def test_read_nonexistent_key():
     """Test reading a non-existent key."""
     print("Testing read of non-existent key...")
     
-    response = requests.get(f"{LEADER_URL}/read", params={"key": "nonexistent"})
+    response = CLIENT.get(f"{LEADER_URL}/read", params={"key": "nonexistent"})
     assert response.status_code == 404
     print("✓ Non-existent key correctly returns 404\n")
 
@@ -153,7 +163,7 @@ def test_store_consistency():
     print("Testing store consistency...")
     
     # Get leader store
-    response = requests.get(f"{LEADER_URL}/store")
+    response = CLIENT.get(f"{LEADER_URL}/store")
     assert response.status_code == 200
     leader_store = response.json()
     print(f"Leader store has {len(leader_store)} keys")
@@ -161,7 +171,7 @@ def test_store_consistency():
     # Get follower stores
     follower_stores = []
     for follower_url in FOLLOWERS:
-        response = requests.get(f"{follower_url}/store", timeout=2)
+        response = CLIENT.get(f"{follower_url}/store", timeout=2)
         if response.status_code == 200:
             follower_stores.append(response.json())
             print(f"Follower store has {len(response.json())} keys")
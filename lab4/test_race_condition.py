@@ -4,38 +4,182 @@ Test script to demonstrate race conditions in replication.
 This script performs concurrent writes to the same key to show race conditions.
 """
 
+import aiohttp
+import asyncio
+import atexit
+import io
+import orjson
 import requests
+import socket
+import statistics
+import sys
 import time
 import concurrent.futures
 import os
+import urllib3
 from typing import Dict, List
-from collections import defaultdict
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
 
 LEADER_URL = os.getenv('LEADER_URL', 'http://localhost:8080')
-FOLLOWERS = [
+# Immutable: nothing mutates the follower set at runtime.
+FOLLOWERS = (
     'http://localhost:8081',
     'http://localhost:8082',
     'http://localhost:8083',
     'http://localhost:8084',
-    'http://localhost:8085'
+    'http://localhost:8085',
+)
+
+# Endpoint URLs are constant; build them once instead of an f-string
+# concatenation inside every request.
+WRITE_URL = f"{LEADER_URL}/write"
+READ_URLS = {url: f"{url}/read" for url in (LEADER_URL, *FOLLOWERS)}
+
+# One session for the whole suite: keep-alive sockets to the leader and
+# each follower instead of a TCP handshake per request. urllib3's pool is
+# thread-safe, so the ThreadPoolExecutor readers/writers share it. No
+# retries - a failed request should surface as a failure, not silently
+# mask the race this test demonstrates.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+# Localhost responses are tens of bytes: negotiating gzip/deflate only
+# adds decode CPU, so ask for identity bodies and keep-alive explicitly.
+SESSION.headers["Accept-Encoding"] = "identity"
+SESSION.headers["Connection"] = "keep-alive"
+
+# COLD=1 is the deliberate inverse of the pooled setup: every request
+# forces a fresh connection so full-handshake latency can be A/B'd
+# against the keep-alive numbers. A separate Session with its own
+# adapter guarantees urllib3 never quietly reuses a warm socket.
+COLD = os.getenv('COLD') == '1'
+if COLD:
+    SESSION = requests.Session()
+    SESSION.mount('http://', HTTPAdapter(pool_connections=16,
+                                         pool_maxsize=32, max_retries=0))
+    SESSION.headers["Accept-Encoding"] = "identity"
+    SESSION.headers["Connection"] = "close"
+# Extra headers for the urllib3 pools, which bypass the Session.
+_COLD_HEADERS = {"Connection": "close"} if COLD else None
+
+# Bodies are orjson-encoded bytes with this constant header; the json=
+# kwarg would re-encode with stdlib json on every call.
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Warm the resolver once at import so the first request to each node
+# never carries a DNS lookup that would distort its latency sample. (The
+# aiohttp connector additionally caches lookups via ttl_dns_cache.)
+for _url in (LEADER_URL, *FOLLOWERS):
+    _parsed = urlparse(_url)
+    try:
+        socket.getaddrinfo(_parsed.hostname, _parsed.port,
+                           type=socket.SOCK_STREAM)
+    except OSError:
+        pass  # unresolvable nodes surface as request errors later
+
+# One explicit urllib3 pool per node for the hot read path: the Session
+# adapter may still open extra sockets under burst, whereas a dedicated
+# HTTPConnectionPool guarantees reuse of at most maxsize warm sockets
+# per host - no surprise re-handshakes.
+POOLS = {
+    url: urllib3.HTTPConnectionPool(
+        urlparse(url).hostname, urlparse(url).port,
+        maxsize=8, timeout=urllib3.Timeout(total=2), retries=False,
+    )
+    for url in (LEADER_URL, *FOLLOWERS)
+}
+
+# Port labels and result-dict keys are pure functions of the follower
+# list; derive them once at import instead of re-splitting the URL on
+# every response.
+FOLLOWER_ENTRIES = [
+    (url, url.rsplit(':', 1)[-1], f"follower_{url.rsplit(':', 1)[-1]}")
+    for url in FOLLOWERS
+]
+_RESULT_KEY = {LEADER_URL: "leader",
+               **{url: result_key for url, _, result_key in FOLLOWER_ENTRIES}}
+# Every node the fan-in read hits, leader included.
+READ_TARGETS = [(LEADER_URL, "leader")] + [
+    (url, result_key) for url, _, result_key in FOLLOWER_ENTRIES
 ]
 
+# RAW_HTTP=1 sends writes straight through the urllib3 pools, skipping
+# requests' Response/CookieJar/hook machinery - worth 20-40% of client
+# CPU when the driver itself is the bottleneck.
+RAW_HTTP = os.getenv('RAW_HTTP') == '1'
+
+# Concurrent writes in the race demonstration; raise it to widen the
+# race window and actually load the leader.
+RACE_WRITES = int(os.getenv('RACE_WRITES', '5'))
+
+# VERBOSE=1 restores the per-write completion listing; by default the
+# summary is a single percentile line, which stays readable (and cheap)
+# when RACE_WRITES is in the hundreds.
+VERBOSE = os.getenv('VERBOSE') == '1'
+
+# One thread pool for the whole suite; spawning and tearing down a pool
+# inside every phase pays thread-creation cost each call and throws the
+# warm threads away. Sized so RACE_WRITES writes can be in flight at
+# once, capped at 4 threads per core.
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=max(16, len(READ_TARGETS),
+                    min(RACE_WRITES, (os.cpu_count() or 4) * 4))
+)
+atexit.register(EXECUTOR.shutdown, wait=False)
+
+# ASYNC_MODE=1 runs the write fan-out and the fan-in reads through one
+# aiohttp.ClientSession on a single event loop: no thread stack or
+# scheduler cost per in-flight request, just pooled keep-alive
+# connections multiplexed by asyncio.
+ASYNC_MODE = bool(os.getenv('ASYNC_MODE'))
+
+# Writes wait on quorum replication; reads should fail fast.
+_WRITE_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+
+def _async_client():
+    # aiohttp carries less per-request overhead than httpx for plain
+    # HTTP/1.1; the connector's DNS cache and keep-alive pool persist
+    # for the session's lifetime.
+    connector = aiohttp.TCPConnector(limit=100, limit_per_host=30,
+                                     ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector,
+                                 timeout=aiohttp.ClientTimeout(total=2))
 
 
+def write_key(key: str, value: str, write_id: int, body: bytes = None):
+    """Write a key-value pair and return the result.
 
-def write_key(key: str, value: str, write_id: int):
-    """Write a key-value pair and return the result."""
+    Callers racing many writes pass a pre-serialized body so the worker
+    does nothing but HTTP I/O inside the race window.
+    """
     try:
-        start_time = time.time()
-        response = requests.post(
-            f"{LEADER_URL}/write",
-            json={"key": key, "value": value},
-            timeout=30
-        )
-        latency = (time.time() - start_time) * 1000
+        # perf_counter_ns is monotonic and vDSO-backed: integer ns with no
+        # wall-clock jumps, so sub-ms latencies survive the conversion.
+        start_ns = time.perf_counter_ns()
+        if body is None:
+            body = orjson.dumps({"key": key, "value": value})
+        if RAW_HTTP:
+            raw = POOLS[LEADER_URL].request(
+                "POST", "/write", body=body,
+                headers={**_JSON_HEADERS, **_COLD_HEADERS} if COLD else _JSON_HEADERS,
+                timeout=30
+            )
+            latency = (time.perf_counter_ns() - start_ns) / 1e6
+            status, content = raw.status, raw.data
+        else:
+            response = SESSION.post(
+                WRITE_URL, data=body, headers=_JSON_HEADERS, timeout=30
+            )
+            latency = (time.perf_counter_ns() - start_ns) / 1e6
+            status, content = response.status_code, response.content
         
-        if response.status_code == 200:
-            data = response.json()
+        if status == 200:
+            data = orjson.loads(content)
             return {
                 "write_id": write_id,
                 "success": True,
@@ -50,7 +194,7 @@ def write_key(key: str, value: str, write_id: int):
             return {
                 "write_id": write_id,
                 "success": False,
-                "error": response.text,
+                "error": content.decode(errors="replace"),
                 "timestamp": time.time()
             }
     except Exception as e:
@@ -64,101 +208,216 @@ def write_key(key: str, value: str, write_id: int):
 
 def read_from_all(key: str) -> Dict[str, any]:
     """Read a key from leader and all followers simultaneously."""
-    results = {}
-    
-    # Read from leader
-    try:
-        response = requests.get(f"{LEADER_URL}/read", params={"key": key}, timeout=2)
-        if response.status_code == 200:
-            results["leader"] = response.json()["value"]
-        else:
-            results["leader"] = f"ERROR: {response.status_code}"
-    except Exception as e:
-        results["leader"] = f"ERROR: {str(e)}"
-    
-    # Read from all followers concurrently
-    def read_follower(follower_url):
+    # The leader read joins the same pool as the followers, so the total
+    # wall time is max(all nodes) rather than leader + max(followers).
+    def read_node(target):
+        url, result_key = target
         try:
-            response = requests.get(f"{follower_url}/read", params={"key": key}, timeout=2)
-            if response.status_code == 200:
-                return follower_url.split(':')[-1], response.json()["value"]
+            response = POOLS[url].request("GET", "/read", fields={"key": key},
+                                          headers=_COLD_HEADERS)
+            if response.status == 200:
+                return result_key, orjson.loads(response.data)["value"]
             else:
-                return follower_url.split(':')[-1], f"ERROR: {response.status_code}"
+                return result_key, f"ERROR: {response.status}"
         except Exception as e:
-            return follower_url.split(':')[-1], f"ERROR: {str(e)}"
+            return result_key, f"ERROR: {str(e)}"
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(FOLLOWERS)) as executor:
-        futures = [executor.submit(read_follower, f) for f in FOLLOWERS]
-        for future in concurrent.futures.as_completed(futures):
-            follower_id, value = future.result()
-            results[f"follower_{follower_id}"] = value
+    results = {}
+    futures = [EXECUTOR.submit(read_node, target) for target in READ_TARGETS]
+    for future in concurrent.futures.as_completed(futures):
+        result_key, value = future.result()
+        results[result_key] = value
     
     return results
 
 
+async def _write_key_async(client, key: str, value: str, write_id: int,
+                           body: bytes = None):
+    """aiohttp counterpart of write_key; returns the same result shape."""
+    try:
+        start_ns = time.perf_counter_ns()
+        if body is None:
+            body = orjson.dumps({"key": key, "value": value})
+        async with client.post(WRITE_URL,
+                               data=body,
+                               headers=_JSON_HEADERS,
+                               timeout=_WRITE_TIMEOUT) as response:
+            body = await response.read()
+        latency = (time.perf_counter_ns() - start_ns) / 1e6
+
+        if response.status == 200:
+            data = orjson.loads(body)
+            return {
+                "write_id": write_id,
+                "success": True,
+                "key": key,
+                "value": value,
+                "latency_ms": latency,
+                "confirmations": data.get("confirmations", 0),
+                "quorum_met": data.get("quorum_met", False),
+                "timestamp": time.time()
+            }
+        return {
+            "write_id": write_id,
+            "success": False,
+            "error": body.decode(errors="replace"),
+            "timestamp": time.time()
+        }
+    except Exception as e:
+        return {
+            "write_id": write_id,
+            "success": False,
+            "error": str(e),
+            "timestamp": time.time()
+        }
+
+
+def _race_payloads(key: str, n: int):
+    """Serialize every racing write before any of them is submitted, so
+    the workers start as close together as the scheduler allows."""
+    return [(f"value_{i}", orjson.dumps({"key": key, "value": f"value_{i}"}))
+            for i in range(n)]
+
+
+async def _read_from_all_async(client, key: str) -> Dict[str, any]:
+    """Read a key from leader and all followers in one gather."""
+    async def read_one(url):
+        async with client.get(READ_URLS[url], params={"key": key}) as response:
+            if response.status == 200:
+                return orjson.loads(await response.read())["value"]
+            return f"ERROR: {response.status}"
+
+    urls = [LEADER_URL, *FOLLOWERS]
+    values = await asyncio.gather(*(read_one(url) for url in urls),
+                                  return_exceptions=True)
+    return {
+        _RESULT_KEY[url]: (f"ERROR: {value}" if isinstance(value, Exception)
+                           else value)
+        for url, value in zip(urls, values)
+    }
+
+
+async def _race_phase_async(key: str, num_writes: int):
+    """Concurrent writes then the fan-in read, on one event loop.
+
+    The client lives across both phases so the reads reuse the warm
+    connections the writes opened.
+    """
+    payloads = _race_payloads(key, num_writes)
+    async with _async_client() as client:
+        write_results = list(await asyncio.gather(
+            *(_write_key_async(client, key, value, i, body)
+              for i, (value, body) in enumerate(payloads))
+        ))
+        # Same divergence poll as the sync path, on the event loop.
+        deadline = time.monotonic() + 0.5
+        while True:
+            read_results = await _read_from_all_async(client, key)
+            diverged = len({v for v in read_results.values()
+                            if not str(v).startswith("ERROR")}) > 1
+            if diverged or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.01)
+    return write_results, read_results
+
+
 def demonstrate_race_condition():
     """Demonstrate race condition with concurrent writes to the same key."""
     print("\n=== Concurrent Write Race Condition Test ===\n")
     
     key = "race_test_key"
-    num_concurrent_writes = 5
+    num_concurrent_writes = RACE_WRITES
     
     print(f"Writing to key='{key}' {num_concurrent_writes} times concurrently...")
     start_time = time.time()
     
-    write_results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_concurrent_writes) as executor:
+    read_results = None
+    if ASYNC_MODE:
+        write_results, read_results = asyncio.run(
+            _race_phase_async(key, num_concurrent_writes)
+        )
+    else:
+        payloads = _race_payloads(key, num_concurrent_writes)
         futures = [
-            executor.submit(write_key, key, f"value_{i}", i)
-            for i in range(num_concurrent_writes)
+            EXECUTOR.submit(write_key, key, value, i, body)
+            for i, (value, body) in enumerate(payloads)
         ]
-        
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            write_results.append(result)
+        # The sort below re-establishes completion order anyway, so skip
+        # as_completed's heap/condition-variable machinery and just block
+        # on each future in submission order.
+        write_results = [future.result() for future in futures]
     
     # Sort by completion time
     write_results.sort(key=lambda x: x.get("timestamp", 0))
     
-    print("\nWrite completion order:")
-    for i, result in enumerate(write_results, 1):
-        if result["success"]:
-            print(f"  {i}. Write #{result['write_id']} (value='{result['value']}') - {result['latency_ms']:.1f}ms")
+    latencies = [r["latency_ms"] for r in write_results if r["success"]]
+    if len(latencies) >= 2:
+        q = statistics.quantiles(latencies, n=100)
+        print(f"\nWrite latency ({len(latencies)} ok): "
+              f"p50={q[49]:.1f}ms p95={q[94]:.1f}ms p99={q[98]:.1f}ms")
+    elif latencies:
+        print(f"\nWrite latency: {latencies[0]:.1f}ms")
+    
+    if VERBOSE:
+        print("\nWrite completion order:")
+        for i, result in enumerate(write_results, 1):
+            if result["success"]:
+                print(f"  {i}. Write #{result['write_id']} (value='{result['value']}') - {result['latency_ms']:.1f}ms")
+    
+    # Poll for the race window instead of sleeping blindly: reads start
+    # immediately and stop as soon as divergence shows up (or after the
+    # same 0.5s cap), so a transient split is never slept through.
+    if read_results is None:
+        deadline = time.monotonic() + 0.5
+        while True:
+            read_results = read_from_all(key)
+            diverged = len({v for v in read_results.values()
+                            if not str(v).startswith("ERROR")}) > 1
+            if diverged or time.monotonic() >= deadline:
+                break
+            time.sleep(0.01)
     
-    # Read immediately to catch race condition
-    time.sleep(0.5)
-    read_results = read_from_all(key)
+    # The report is 20+ lines; build it in one StringIO and emit it with
+    # a single write instead of paying a stdout lock + flush per print.
+    report = io.StringIO()
+    out = lambda line="": report.write(line + "\n")
     
-    print("\nValues in each node:")
-    print(f"  Leader:     {read_results.get('leader', 'NOT FOUND')}")
+    out("\nValues in each node:")
+    out(f"  Leader:     {read_results.get('leader', 'NOT FOUND')}")
     for i in range(1, 6):
         follower_key = f"follower_808{i}"
-        print(f"  Follower {i}:  {read_results.get(follower_key, 'NOT FOUND')}")
-    
-    # Analyze
-    all_values = set(read_results.values())
-    unique_values = [v for v in all_values if not v.startswith("ERROR") and v != "NOT FOUND"]
-    
-    print(f"\nRace condition detected: {len(unique_values) > 1}")
-    if len(unique_values) > 1:
-        print(f"  Found {len(unique_values)} different values: {sorted(unique_values)}")
-        print("\n  What this means:")
-        print("    - We wrote 5 times to the same key concurrently:")
-        for i in range(5):
-            print(f"      • Write #{i} → value='value_{i}'")
-        print(f"\n    - Different replicas ended up with different values:")
-        for val in sorted(unique_values):
+        out(f"  Follower {i}:  {read_results.get(follower_key, 'NOT FOUND')}")
+    
+    # Analyze: one Counter pass over the node values yields both
+    # uniqueness and how many replicas hold each value, instead of a set
+    # build plus a filter plus repeated sorts.
+    value_counts = Counter(
+        v for v in read_results.values()
+        if not str(v).startswith("ERROR") and v != "NOT FOUND"
+    )
+    
+    out(f"\nRace condition detected: {len(value_counts) > 1}")
+    if len(value_counts) > 1:
+        out(f"  Found {len(value_counts)} different values: {sorted(value_counts)}")
+        out("\n  What this means:")
+        out(f"    - We wrote {num_concurrent_writes} times to the same key concurrently:")
+        for i in range(num_concurrent_writes):
+            out(f"      • Write #{i} → value='value_{i}'")
+        out(f"\n    - Different replicas ended up with different values:")
+        for val, count in value_counts.most_common():
             write_id = val.split('_')[1] if '_' in val else '?'
-            print(f"      • Some replicas have '{val}' (from Write #{write_id})")
-        print("\n  Why this happens:")
-        print("    - All writes started at the same time")
-        print("    - Each write replicates to all followers")
-        print("    - Network delays cause replications to arrive in different orders")
-        print("    - Each replica stores the LAST value it receives")
-        print("    - Result: Different replicas have different values!")
+            out(f"      • {count} replica(s) have '{val}' (from Write #{write_id})")
+        out("\n  Why this happens:")
+        out("    - All writes started at the same time")
+        out("    - Each write replicates to all followers")
+        out("    - Network delays cause replications to arrive in different orders")
+        out("    - Each replica stores the LAST value it receives")
+        out("    - Result: Different replicas have different values!")
     else:
-        print(f"  All replicas converged to: {unique_values[0] if unique_values else 'NONE'}")
-        print("  (Race condition resolved - system reached eventual consistency)")
+        out(f"  All replicas converged to: {next(iter(value_counts), 'NONE')}")
+        out("  (Race condition resolved - system reached eventual consistency)")
+    
+    sys.stdout.write(report.getvalue())
 
 
 def demonstrate_replication_order():
@@ -169,14 +428,15 @@ def demonstrate_replication_order():
     value = "order_test_value"
     
     print(f"Writing key='{key}' with value='{value}'...")
-    response = requests.post(
-        f"{LEADER_URL}/write",
-        json={"key": key, "value": value},
+    response = SESSION.post(
+        WRITE_URL,
+        data=orjson.dumps({"key": key, "value": value}),
+        headers=_JSON_HEADERS,
         timeout=30
     )
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         print(f"\nWrite result:")
         print(f"  Confirmations: {data.get('confirmations', 0)}")
         print(f"  Latency: {data.get('latency_ms', 0):.2f}ms")